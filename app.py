@@ -1,6 +1,8 @@
+import os
+
 import dotenv
 
-from core.constants import DOTENV_PATH
+from core.constants import CHAT_HISTORY_ENV, CHAT_HISTORY_PATH, DOTENV_PATH, METRICS_PORT_ENV
 from streamlit_app.components.auth import authenticate
 
 dotenv.load_dotenv(DOTENV_PATH)
@@ -8,16 +10,13 @@ dotenv.load_dotenv(DOTENV_PATH)
 import streamlit as st
 from langchain_community.callbacks import StreamlitCallbackHandler
 from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import HumanMessage
 
-from core.chains.google_search import build_search_chain, build_google_search_retriever
-from core.chains.query_evaluation import build_evaluate_question_chain, QuestionEvaluation, QuestionDifficulty
-from core.chains.raptor import build_rag_chain
-from core.constants import CHROMA_VECTORS
-from core.embdeddings import get_embeddings
-from core.llms import get_gemini_llm
-from core.vectorstores.chroma import load_vector_store
-from streamlit_app.components.chat import fill_messages_from_session, clear_chat_history
+from core.chains.query_evaluation import QuestionEvaluation, QuestionDifficulty
+from core.chains.simple import generate_answer, stream_answer
+from core.history.store import ConversationHistory, build_conversation_store
+from core.registry import ResourceRegistry, get_resource_registry
+from streamlit_app.callbacks.tracing_callback_handler import PrometheusMetrics, TracingCallbackHandler
+from streamlit_app.components.chat import append_message, fill_messages_from_session, clear_chat_history
 
 st.set_page_config(
     page_title="⚖️🏛️📜LexLead Law Advisor⚖️🎓🏛️",
@@ -36,36 +35,106 @@ def display_question_evaluation(instance):
     st.markdown(f"**Is Illinois Law:** {instance.is_illinois_law}")
 
 
-def app():
+@st.cache_resource
+def get_registry() -> ResourceRegistry:
+    registry = get_resource_registry()
+    registry.warm_up(background=True)
+    return registry
+
+
+@st.cache_resource
+def get_metrics() -> PrometheusMetrics:
+    metrics = PrometheusMetrics()
+    if port := os.environ.get(METRICS_PORT_ENV):
+        metrics.serve(int(port))
+    return metrics
+
+
+@st.cache_resource
+def get_history() -> ConversationHistory:
+    return ConversationHistory(build_conversation_store(os.environ.get(CHAT_HISTORY_ENV, CHAT_HISTORY_PATH)))
+
+
+def display_trace(tracer: TracingCallbackHandler, metrics: PrometheusMetrics):
+    with st.expander("Trace"):
+        st.dataframe(tracer.summary(), hide_index=True)
+        st.code(metrics.render(), language="text")
+
+
+def display_resource_health(registry: ResourceRegistry):
+    with st.sidebar.expander("Resources"):
+        for name, health in registry.health().items():
+            took = f" in {health.build_seconds:.2f}s" if health.build_seconds is not None else ""
+            st.caption(f"**{name}**: {health.status}{took}")
+
+
+def app(registry: ResourceRegistry, metrics: PrometheusMetrics, history: ConversationHistory):
     st.write("# ⚖️🏛️📜LexLead Law Advisor⚖️🎓🏛️")
-    st.sidebar.button('Clear Chat History', on_click=clear_chat_history)
-    fill_messages_from_session()
+    st.sidebar.button('Clear Chat History', on_click=clear_chat_history, args=(history,))
+    streaming = st.sidebar.toggle("Stream answers", value=True)
+    developer_mode = st.sidebar.toggle("Developer mode", value=False)
+    display_resource_health(registry)
+    fill_messages_from_session(history)
     if prompt := st.chat_input(placeholder="How to fill a inheritance form?"):
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        llm = registry.get("llm")
+        evaluate_question_chain = registry.get("evaluate_question_chain")
+        semantic_cache = registry.get("semantic_cache")
+        context_manager = registry.get("context_manager")
+        context = history.context(st.session_state.conversation_id)
+        earlier_messages = list(st.session_state.messages)
+        append_message("user", prompt, history)
         with st.chat_message("user"):
             st.write(prompt)
         with st.chat_message("assistant", avatar="⚖️"):
-            cfg = RunnableConfig(callbacks=[StreamlitCallbackHandler(st.container(), expand_new_thoughts=True)])
-            answer = evaluate_question_chain.invoke({"question": prompt}, cfg)[0]["args"]
+            tracer = TracingCallbackHandler(metrics)
+            cfg = RunnableConfig(callbacks=[
+                StreamlitCallbackHandler(st.container(), expand_new_thoughts=True), tracer
+            ])
+            question = context_manager.standalone_question(context, earlier_messages, prompt, cfg)
+            if question != prompt:
+                st.caption(f"Answering: {question}")
+            answer = evaluate_question_chain.invoke({"question": question}, cfg)[0]["args"]
             evaluation = QuestionEvaluation.model_validate(answer)
             display_question_evaluation(evaluation)
 
             if evaluation.is_illinois_law and evaluation.is_rag_useful:
-                result = rag_chain.invoke({"question": prompt}, cfg)
+                chain = registry.get("rag_chain")
             elif evaluation.difficulty_response == QuestionDifficulty.EASY:
-                result = llm.invoke([HumanMessage(content=prompt)])
+                chain = None
+            else:
+                chain = registry.get("google_chain")
+
+            if streaming:
+                if chain is None:
+                    result = st.write_stream(stream_answer(
+                        llm, prompt, cfg, context_manager.history(context, earlier_messages)
+                    ))
+                else:
+                    result = st.write_stream(chain.stream({"question": question}, cfg))
             else:
-                result = google_chain.invoke({"question": prompt}, cfg)
-            st.write(result)
-            message = {"role": "assistant", "content": result}
-            st.session_state.messages.append(message)
+                if chain is None:
+                    result = generate_answer(llm, prompt, cfg, context_manager.history(context, earlier_messages))
+                else:
+                    result = chain.invoke({"question": question}, cfg)
+                st.write(result)
+            st.sidebar.caption(
+                f"Answer cache hit rate: {semantic_cache.stats.hit_rate:.0%} "
+                f"({semantic_cache.stats.hits}/{semantic_cache.stats.lookups})"
+            )
+            for task, stats in registry.get("local_classifier").stats.items():
+                st.sidebar.caption(
+                    f"Local {task}: {stats.local_rate:.0%} answered locally, "
+                    f"{stats.agreement_rate:.0%} agreement with the LLM ({stats.compared} compared)"
+                )
+            if developer_mode:
+                display_trace(tracer, metrics)
+            append_message("assistant", result, history)
+            # the summarizer runs off the request path, streamlit callbacks only work on the script thread
+            messages = list(st.session_state.messages)
+            history.fold_context(
+                st.session_state.conversation_id, lambda stored: context_manager.update(stored, messages)
+            )
 
 
 if __name__ == "__main__":
-    llm = get_gemini_llm()
-    embeddings = get_embeddings()
-    vector_store = load_vector_store(embeddings, str(CHROMA_VECTORS))
-    google_chain = build_search_chain(llm, build_google_search_retriever())
-    evaluate_question_chain = build_evaluate_question_chain(llm)
-    rag_chain = build_rag_chain(llm, vector_store)
-    app()
+    app(get_registry(), get_metrics(), get_history())
@@ -0,0 +1,349 @@
+"""Parallel, resumable LLM-judged evaluation of the answering systems.
+
+Every (system, question) pair is answered and then graded by a judge LLM on the
+0/1/2 scale of ``research/LLM_Judger.ipynb``. A bounded pool of async workers does
+the work, and each provider gets its own token bucket. Finished records are appended
+to a JSONL checkpoint, so an interrupted run resumes where it stopped. Verdicts are
+cached by (question, answer, judge prompt), so re-running after a change only grades
+the answers that actually changed.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from langchain.chat_models.base import BaseChatModel
+from langchain.vectorstores import VectorStore
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, Field
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
+
+from core.benchmark.retrieval import QUESTION_SETS, BenchmarkQuestion, load_questions
+from core.caches.verdicts import VerdictCache, verdict_key
+from core.constants import EVALUATION_RESULTS, VERDICT_CACHE_PATH
+from core.retrievers.bm25 import tokenize
+
+_logger = logging.getLogger(__name__)
+
+
+JUDGE_SYSTEM_PROMPT = """
+Evaluate the relevance of the generated answer to the correct answer.
+Determine if the generated answer is correct and substantively captures the key points
+of the correct answer. Only the meaning matters: different phrasing or structure, or
+additional details that do not contradict the correct answer, are not penalized.
+Score 2 means perfectly or almost perfectly correct (the meaning is the same),
+1 means partially correct, 0 means irrelevant or wrong.
+Give the score and a brief explanation.
+"""
+
+
+class JudgeVerdict(BaseModel):
+    """Score of a generated answer against the correct answer."""
+    score: int = Field(description="2 correct, 1 partially correct, 0 irrelevant or wrong")
+    explanation: str = Field(description="Brief explanation of the score")
+
+
+class EvaluationRecord(BaseModel):
+    system: str
+    question_set: str
+    question: str
+    ground_truth: str
+    answer: str
+    answerer: str = ""
+    answer_seconds: float
+    score: int
+    explanation: str
+    judge: str
+    judge_cached: bool = False
+
+
+def build_judge_chain(llm: BaseChatModel) -> Runnable:
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", JUDGE_SYSTEM_PROMPT),
+        ("human", "Question: {question}\nGenerated Answer: {answer}\nCorrect Answer: {ground_truth}"),
+    ])
+    return prompt | llm.with_structured_output(JudgeVerdict)
+
+
+def overlap_verdict(inputs: dict) -> JudgeVerdict:
+    """Deterministic stand-in judge scoring by reference-term coverage."""
+    reference = set(tokenize(inputs["ground_truth"]))
+    coverage = len(reference.intersection(tokenize(inputs["answer"]))) / len(reference) if reference else 0.0
+    score = 2 if coverage >= 0.6 else 1 if coverage >= 0.3 else 0
+    return JudgeVerdict(score=score, explanation=f"reference term coverage {coverage:.2f}")
+
+
+def _checkpoint_key(system: str, question: BenchmarkQuestion, answerer: str) -> tuple[str, str, str, str]:
+    return system, question.question_set, question.question, answerer
+
+
+class EvaluationCheckpoint:
+    """Append-only JSONL of finished records, the last record per key wins.
+
+    The answering configuration is part of the key, so offline and real runs can share a file.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def load(self) -> dict[tuple[str, str, str, str], EvaluationRecord]:
+        records = {}
+        if not self.path.exists():
+            return records
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = EvaluationRecord.model_validate_json(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted run
+                records[(record.system, record.question_set, record.question, record.answerer)] = record
+        return records
+
+    def append(self, record: EvaluationRecord) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(record.model_dump_json() + "\n")
+
+
+class EvaluationRunner:
+    def __init__(
+        self,
+        systems: dict[str, tuple[str, Runnable]],
+        judge: tuple[str, Runnable],
+        judge_id: str,
+        answerer_id: str,
+        verdicts: VerdictCache,
+        checkpoint: EvaluationCheckpoint,
+        requests_per_second: dict[str, float],
+        max_concurrency: int = 8,
+        max_attempts: int = 4,
+    ) -> None:
+        self.systems = systems
+        self.judge_provider, self.judge = judge
+        self.judge_id = judge_id
+        self.answerer_id = answerer_id
+        self.verdicts = verdicts
+        self.checkpoint = checkpoint
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        providers = {provider for provider, _ in systems.values()} | {self.judge_provider}
+        self.limiters = {
+            provider: InMemoryRateLimiter(
+                requests_per_second=requests_per_second.get(provider, 2.0),
+                check_every_n_seconds=0.05,
+                max_bucket_size=max(1, max_concurrency),
+            )
+            for provider in providers
+        }
+        self.failures = 0
+
+    async def _call(self, provider: str, runnable: Runnable, inputs: dict):
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_exponential(multiplier=1, max=30),
+            reraise=True,
+        ):
+            with attempt:
+                await self.limiters[provider].aacquire()
+                return await runnable.ainvoke(inputs)
+
+    async def _judge(self, question: BenchmarkQuestion, answer: str) -> tuple[JudgeVerdict, bool]:
+        key = verdict_key(question.question, answer, self.judge_id)
+        cached = self.verdicts.get(key)
+        if cached is not None:
+            return JudgeVerdict.model_validate(cached), True
+        verdict = await self._call(self.judge_provider, self.judge, {
+            "question": question.question, "answer": answer, "ground_truth": question.answer,
+        })
+        self.verdicts.put(key, verdict.model_dump())
+        return verdict, False
+
+    async def _evaluate(
+        self, system: str, question: BenchmarkQuestion, previous: EvaluationRecord | None
+    ) -> EvaluationRecord:
+        if previous is not None:
+            answer, answer_seconds = previous.answer, previous.answer_seconds
+        else:
+            provider, chain = self.systems[system]
+            started = time.perf_counter()
+            answer = await self._call(provider, chain, {"question": question.question})
+            answer = answer.content if hasattr(answer, "content") else str(answer)
+            answer_seconds = time.perf_counter() - started
+        verdict, cached = await self._judge(question, answer)
+        return EvaluationRecord(
+            system=system,
+            question_set=question.question_set,
+            question=question.question,
+            ground_truth=question.answer,
+            answer=answer,
+            answerer=self.answerer_id,
+            answer_seconds=answer_seconds,
+            score=verdict.score,
+            explanation=verdict.explanation,
+            judge=self.judge_id,
+            judge_cached=cached,
+        )
+
+    async def arun(self, questions: list[BenchmarkQuestion]) -> list[EvaluationRecord]:
+        done = self.checkpoint.load()
+        queue: asyncio.Queue = asyncio.Queue()
+        results = []
+        for system in self.systems:
+            for question in questions:
+                # only answers of the same answering configuration are reused, a new judge re-grades them
+                previous = done.get(_checkpoint_key(system, question, self.answerer_id))
+                if previous is not None and previous.judge == self.judge_id:
+                    results.append(previous)
+                else:
+                    queue.put_nowait((system, question, previous))
+        _logger.info("%d records restored from %s, %d to evaluate", len(results), self.checkpoint.path, queue.qsize())
+
+        async def worker() -> None:
+            while True:
+                try:
+                    system, question, previous = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    record = await self._evaluate(system, question, previous)
+                except Exception:
+                    self.failures += 1
+                    _logger.exception("Giving up on %s / %s", system, question.question)
+                    continue
+                self.checkpoint.append(record)
+                results.append(record)
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+        return results
+
+    def run(self, questions: list[BenchmarkQuestion]) -> list[EvaluationRecord]:
+        return asyncio.run(self.arun(questions))
+
+
+def summarize(records: Iterable[EvaluationRecord]) -> dict[str, dict]:
+    by_system: dict[str, list[EvaluationRecord]] = {}
+    for record in records:
+        by_system.setdefault(record.system, []).append(record)
+    summary = {}
+    for system, items in sorted(by_system.items()):
+        scores = np.array([record.score for record in items])
+        seconds = np.array([record.answer_seconds for record in items])
+        summary[system] = {
+            "questions": len(items),
+            "accuracy": float((scores == 2).mean()),
+            "mean_score": float(scores.mean()),
+            "by_question_set": {
+                question_set: float(np.mean([record.score == 2 for record in items if record.question_set == question_set]))
+                for question_set in sorted({record.question_set for record in items})
+            },
+            "answer_seconds_p50": float(np.percentile(seconds, 50)),
+            "answer_seconds_p95": float(np.percentile(seconds, 95)),
+        }
+    return summary
+
+
+def build_systems(
+    names: Iterable[str], provider: str, llm: BaseChatModel, vectorstore: VectorStore, lexical_index_path: Path
+) -> dict[str, tuple[str, Runnable]]:
+    from core.chains.raptor import build_rag_chain
+    from core.retrievers.hybrid import build_hybrid_retriever
+    from core.retrievers.raptor import RaptorRetriever
+
+    factories = {
+        "raptor": lambda: build_rag_chain(llm, vectorstore),
+        # leaves only on a RAPTOR store, a plain top 8 on a store without level metadata
+        "simple_rag": lambda: build_rag_chain(
+            llm, vectorstore, retriever=RaptorRetriever(vectorstore=vectorstore, leaf_k=8, summary_k=0)
+        ),
+        "hybrid": lambda: build_rag_chain(llm, vectorstore, retriever=build_hybrid_retriever(vectorstore, lexical_index_path)),
+        "llm_only": lambda: RunnableLambda(lambda inputs: inputs["question"]) | llm,
+    }
+    return {name: (provider, factories[name]()) for name in names}
+
+
+SYSTEMS = ("raptor", "simple_rag", "hybrid", "llm_only")
+
+
+def _get_llm(provider: str) -> BaseChatModel:
+    from core.llms import get_gemini_llm, get_openai_llm
+    return get_gemini_llm() if provider == "gemini" else get_openai_llm()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Answer the benchmark questions and grade them with an LLM judge")
+    parser.add_argument("--systems", nargs="+", choices=SYSTEMS, default=["raptor", "simple_rag"])
+    parser.add_argument("--question-sets", nargs="+", choices=QUESTION_SETS, default=list(QUESTION_SETS))
+    parser.add_argument("--answer-llm", choices=["gemini", "openai"], default="gemini")
+    parser.add_argument("--judge-llm", choices=["gemini", "openai"], default="openai")
+    parser.add_argument("--rps", nargs="*", default=[], metavar="PROVIDER=RATE",
+                        help="requests per second per provider, e.g. gemini=1 openai=5")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--checkpoint", default=str(EVALUATION_RESULTS))
+    parser.add_argument("--verdict-cache", default=str(VERDICT_CACHE_PATH))
+    parser.add_argument("--offline", action="store_true",
+                        help="use the local stand-in embeddings, answering LLM and judge")
+    parser.add_argument("--output", help="write the JSON summary here instead of stdout")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from core.constants import BENCHMARK_VECTORS, CHROMA_VECTORS, DOTENV_PATH
+    from core.vectorstores.chroma import LEXICAL_INDEX_FILENAME, load_vector_store
+
+    if args.offline:
+        from core.benchmark.stand_ins import ExtractiveChatModel, HashingEmbeddings
+        answer_provider, judge_provider = "stand-in", "stand-in"
+        llm, embeddings, persist_directory = ExtractiveChatModel(), HashingEmbeddings(), BENCHMARK_VECTORS
+        judge, judge_id = RunnableLambda(overlap_verdict), "stand-in:overlap"
+        answerer_id = "offline:stand-in:extractive"
+    else:
+        import dotenv
+        from core.embdeddings import get_embeddings
+        dotenv.load_dotenv(DOTENV_PATH)
+        answer_provider, judge_provider = args.answer_llm, args.judge_llm
+        llm, embeddings, persist_directory = _get_llm(args.answer_llm), get_embeddings(), CHROMA_VECTORS
+        answer_model = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+        answerer_id = f"{args.answer_llm}:{answer_model}"
+        judge_llm = _get_llm(args.judge_llm)
+        judge = build_judge_chain(judge_llm)
+        judge_model = getattr(judge_llm, "model_name", None) or getattr(judge_llm, "model", "")
+        prompt_hash = hashlib.sha256(JUDGE_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+        judge_id = f"{args.judge_llm}:{judge_model}:{prompt_hash}"
+
+    vectorstore = load_vector_store(embeddings, str(persist_directory))
+    runner = EvaluationRunner(
+        systems=build_systems(args.systems, answer_provider, llm, vectorstore, Path(persist_directory) / LEXICAL_INDEX_FILENAME),
+        judge=(judge_provider, judge),
+        judge_id=judge_id,
+        answerer_id=answerer_id,
+        verdicts=VerdictCache(args.verdict_cache),
+        checkpoint=EvaluationCheckpoint(args.checkpoint),
+        requests_per_second={
+            "stand-in": 1000.0, **{provider: float(rate) for provider, rate in (item.split("=", 1) for item in args.rps)}
+        },
+        max_concurrency=args.max_concurrency,
+        max_attempts=args.max_attempts,
+    )
+    started = time.perf_counter()
+    records = runner.run(load_questions(question_sets=args.question_sets))
+    report = {
+        "elapsed_seconds": time.perf_counter() - started,
+        "failures": runner.failures,
+        "verdict_cache": {"hits": runner.verdicts.hits, "misses": runner.verdicts.misses},
+        "systems": summarize(records),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Compare the separate (two calls) and combined (one call) generation graders.
+
+Each sample is a question, its retrieved documents and a generation. Generations are the
+reference answers of the bundled question sets, plus the answers stored in an evaluation
+checkpoint (``core.benchmark.evaluation``) when ``--records`` is given. Both graders run
+over the same samples. The report has per-mode latency and LLM call counts, and how
+often the two modes agree on the final grade and on each verdict.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from core.benchmark.evaluation import EvaluationCheckpoint
+from core.benchmark.retrieval import QUESTION_SETS, load_questions, summarize_latencies
+from rag.node import CombinedGenerationGradingNode, HallucinationGradingNode
+from core.retrievers.bm25 import tokenize
+
+_logger = logging.getLogger(__name__)
+
+
+class GradingSample(BaseModel):
+    question: str
+    generation: str
+    documents: list[Document]
+
+
+class GradingModeReport(BaseModel):
+    latency_ms: dict[str, float]
+    llm_calls: int
+    grades: dict[str, int]
+
+
+class GradingComparison(BaseModel):
+    samples: int
+    separate: GradingModeReport
+    combined: GradingModeReport
+    agreement: float
+    grounded_agreement: float
+    useful_agreement: float | None
+    confusion: dict[str, int]
+
+
+def _coverage(terms: list[str], reference: str) -> float:
+    terms = set(terms)
+    return len(terms.intersection(tokenize(reference))) / len(terms) if terms else 0.0
+
+
+def _stand_in_grounded(inputs: dict) -> bool:
+    facts = " ".join(d.page_content if isinstance(d, Document) else str(d) for d in inputs["documents"])
+    return _coverage(tokenize(inputs["generation"]), facts) >= 0.5
+
+
+def _stand_in_useful(inputs: dict) -> bool:
+    return _coverage(tokenize(inputs["question"]), inputs["generation"]) >= 0.2
+
+
+def _yes(value: bool) -> str:
+    return "yes" if value else "no"
+
+
+def build_stand_in_nodes() -> tuple[HallucinationGradingNode, CombinedGenerationGradingNode]:
+    from rag.chains.answer_grading import GradeAnswer
+    from rag.chains.generation_grading import GradeGeneration
+    from rag.chains.hallucination_grading import GradeHallucinations
+
+    separate = HallucinationGradingNode(
+        hallucination_grader=RunnableLambda(lambda x: GradeHallucinations(binary_score=_yes(_stand_in_grounded(x)))),
+        answer_grader=RunnableLambda(lambda x: GradeAnswer(binary_score=_yes(_stand_in_useful(x)))),
+    )
+    combined = CombinedGenerationGradingNode(generation_grader=RunnableLambda(lambda x: GradeGeneration(
+        grounded=_yes(_stand_in_grounded(x)), useful=_yes(_stand_in_useful(x)),
+    )))
+    return separate, combined
+
+
+def build_nodes() -> tuple[HallucinationGradingNode, CombinedGenerationGradingNode]:
+    from rag.chains.answer_grading import build_answer_grading_chain
+    from rag.chains.generation_grading import build_generation_grading_chain
+    from rag.chains.hallucination_grading import build_hallucination_grading_chain
+
+    separate = HallucinationGradingNode(
+        hallucination_grader=build_hallucination_grading_chain(),
+        answer_grader=build_answer_grading_chain(),
+    )
+    combined = CombinedGenerationGradingNode(generation_grader=build_generation_grading_chain())
+    return separate, combined
+
+
+def load_samples(
+    retriever: BaseRetriever, question_sets=QUESTION_SETS, records_path: str | Path | None = None
+) -> list[GradingSample]:
+    pairs = [(question.question, question.answer) for question in load_questions(question_sets=question_sets)]
+    if records_path is not None:
+        pairs.extend((record.question, record.answer) for record in EvaluationCheckpoint(records_path).load().values())
+    documents = retriever.batch([question for question, _ in pairs])
+    return [
+        GradingSample(question=question, generation=generation, documents=docs)
+        for (question, generation), docs in zip(pairs, documents)
+    ]
+
+
+async def _grade_all(node, samples: list[GradingSample], max_concurrency: int) -> tuple[list[str], list[float]]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def grade(sample: GradingSample) -> tuple[str, float]:
+        state = {
+            "question": sample.question, "documents": sample.documents, "generation": sample.generation,
+            "tokens_used": 0, "regenerations": 0, "best_grade": None,
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            update = await node.acall(state)
+            return update["generation_grade"], time.perf_counter() - started
+
+    results = await asyncio.gather(*(grade(sample) for sample in samples))
+    return [grade for grade, _ in results], [seconds for _, seconds in results]
+
+
+def compare_graders(
+    separate: HallucinationGradingNode,
+    combined: CombinedGenerationGradingNode,
+    samples: list[GradingSample],
+    max_concurrency: int = 8,
+) -> GradingComparison:
+    separate_grades, separate_seconds = asyncio.run(_grade_all(separate, samples, max_concurrency))
+    combined_grades, combined_seconds = asyncio.run(_grade_all(combined, samples, max_concurrency))
+
+    pairs = list(zip(separate_grades, combined_grades))
+    both_grounded = [(a, b) for a, b in pairs if a != "not supported" and b != "not supported"]
+    return GradingComparison(
+        samples=len(samples),
+        separate=GradingModeReport(
+            latency_ms=summarize_latencies(separate_seconds),
+            # the answer grader only runs on grounded generations
+            llm_calls=sum(1 if grade == "not supported" else 2 for grade in separate_grades),
+            grades=dict(Counter(separate_grades)),
+        ),
+        combined=GradingModeReport(
+            latency_ms=summarize_latencies(combined_seconds),
+            llm_calls=len(combined_grades),
+            grades=dict(Counter(combined_grades)),
+        ),
+        agreement=float(np.mean([a == b for a, b in pairs])),
+        grounded_agreement=float(np.mean([(a == "not supported") == (b == "not supported") for a, b in pairs])),
+        useful_agreement=float(np.mean([a == b for a, b in both_grounded])) if both_grounded else None,
+        confusion={f"{a} | {b}": count for (a, b), count in sorted(Counter(pairs).items())},
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare separate and combined generation grading")
+    parser.add_argument("--question-sets", nargs="+", choices=QUESTION_SETS, default=list(QUESTION_SETS))
+    parser.add_argument("--records", help="evaluation checkpoint whose answers are graded as well")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--offline", action="store_true", help="use local stand-in embeddings and graders")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from core.constants import BENCHMARK_VECTORS, CHROMA_VECTORS, DOTENV_PATH
+    from core.vectorstores.chroma import load_vector_store
+    from core.retrievers.raptor import RaptorRetriever
+
+    if args.offline:
+        from core.benchmark.stand_ins import HashingEmbeddings
+        embeddings, persist_directory = HashingEmbeddings(), BENCHMARK_VECTORS
+        separate, combined = build_stand_in_nodes()
+    else:
+        import dotenv
+        from core.embdeddings import get_embeddings
+        dotenv.load_dotenv(DOTENV_PATH)
+        embeddings, persist_directory = get_embeddings(), CHROMA_VECTORS
+        separate, combined = build_nodes()
+
+    retriever = RaptorRetriever(vectorstore=load_vector_store(embeddings, str(persist_directory)))
+    samples = load_samples(retriever, args.question_sets, args.records)
+    _logger.info("Grading %d samples in both modes", len(samples))
+    output = compare_graders(separate, combined, samples, args.max_concurrency).model_dump_json(indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
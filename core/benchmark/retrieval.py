@@ -0,0 +1,308 @@
+"""Offline retrieval benchmark over the bundled question sets.
+
+Runs every retriever configuration against a Chroma store embedded with the deterministic
+``HashingEmbeddings`` stand-in, so no model endpoint is called. Relevance labels come from
+``--qrels`` (question -> chunk ids) when given, otherwise from silver labels: chunks that
+contain most of the content words of the reference answer (or of the question for
+yes/no answers).
+"""
+import argparse
+import json
+import logging
+import resource
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+import numpy as np
+from langchain.vectorstores import VectorStore
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel
+
+from core.benchmark.stand_ins import ExtractiveChatModel, HashingEmbeddings
+from core.constants import BENCHMARK_VECTORS, BENCHMARKS, RAPTOR_CORPUS
+from core.vectorstores.ingestion import chunk_id
+from core.retrievers.bm25 import BM25Index, tokenize
+from core.retrievers.hybrid import HybridRetriever
+from core.retrievers.raptor import RaptorRetriever
+
+_logger = logging.getLogger(__name__)
+
+QUESTION_SETS = ("binary", "shortanswer")
+PERCENTILES = (50, 95, 99)
+
+
+class BenchmarkQuestion(BaseModel):
+    question_set: str
+    question: str
+    answer: str
+
+
+class RetrieverReport(BaseModel):
+    name: str
+    latency_ms: dict[str, float]
+    qps: float
+    recall_at_k: dict[str, float]
+    hit_rate_at_k: dict[str, float]
+    labelled_questions: int
+    mean_documents: float
+    generation_latency_ms: dict[str, float] | None = None
+
+
+class BenchmarkReport(BaseModel):
+    started_at: float
+    corpus_chunks: int
+    questions: int
+    label_source: str
+    build_seconds: float
+    cached_build_seconds: float | None = None
+    index_load_seconds: dict[str, float]
+    peak_rss_mb: dict[str, float]
+    settings: dict
+    retrievers: list[RetrieverReport]
+
+
+RetrieverFactory = Callable[[VectorStore, BM25Index], Runnable]
+
+RETRIEVER_CONFIGS: dict[str, RetrieverFactory] = {
+    "dense": lambda vectorstore, index: vectorstore.as_retriever(search_kwargs={"k": 10}),
+    "raptor": lambda vectorstore, index: RaptorRetriever(vectorstore=vectorstore),
+    "bm25": lambda vectorstore, index: RunnableLambda(
+        lambda query: [document for document, _ in index.search(query, k=10)], name="bm25"
+    ),
+    "hybrid": lambda vectorstore, index: HybridRetriever(
+        vector_retriever=RaptorRetriever(vectorstore=vectorstore), lexical_index=index
+    ),
+    "hybrid_no_fast_path": lambda vectorstore, index: HybridRetriever(
+        vector_retriever=RaptorRetriever(vectorstore=vectorstore), lexical_index=index, citation_fast_path=False
+    ),
+}
+
+
+def load_questions(directory: str | Path = BENCHMARKS, question_sets: Iterable[str] = QUESTION_SETS) -> list[BenchmarkQuestion]:
+    questions = []
+    for question_set in question_sets:
+        with open(Path(directory) / f"{question_set}_benchmark_question.json", encoding="utf-8") as f:
+            data = json.load(f)
+        questions.extend(
+            BenchmarkQuestion(question_set=question_set, question=question.strip(), answer=answer.strip())
+            for question, answer in zip(data["questions"], data["answers"])
+        )
+    return questions
+
+
+def silver_labels(
+    questions: list[BenchmarkQuestion], index: BM25Index, min_coverage: float = 0.6
+) -> list[set[str]]:
+    chunk_tokens = [set(tokenize(text)) for text in index.texts]
+    labels = []
+    for question in questions:
+        terms = set(tokenize(question.answer))
+        if len(terms) < 3:
+            terms = set(tokenize(question.question.replace("(yes or no)", "")))
+        labels.append({
+            chunk_id(text)
+            for text, tokens in zip(index.texts, chunk_tokens)
+            if terms and len(terms & tokens) / len(terms) >= min_coverage
+        })
+    return labels
+
+
+def load_qrels(path: str | Path, questions: list[BenchmarkQuestion]) -> list[set[str]]:
+    with open(path, encoding="utf-8") as f:
+        qrels = json.load(f)
+    return [set(qrels.get(question.question, [])) for question in questions]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize_latencies(latencies: list[float]) -> dict[str, float]:
+    values = np.asarray(latencies) * 1000
+    summary = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+    summary["mean"] = float(values.mean())
+    return summary
+
+
+def benchmark_retriever(
+    name: str,
+    retriever: Runnable,
+    questions: list[BenchmarkQuestion],
+    labels: list[set[str]],
+    k_values: Iterable[int] = (1, 5, 10),
+    repeats: int = 3,
+    concurrency: int = 8,
+    generation_chain: Runnable | None = None,
+) -> RetrieverReport:
+    queries = [question.question for question in questions]
+    retriever.batch(queries[:2])  # warm-up
+
+    latencies, rankings = [], []
+    for _ in range(repeats):
+        rankings = []
+        for query in queries:
+            started = time.perf_counter()
+            documents = retriever.invoke(query)
+            latencies.append(time.perf_counter() - started)
+            rankings.append([chunk_id(document.page_content) for document in documents])
+
+    started = time.perf_counter()
+    retriever.batch(queries, config={"max_concurrency": concurrency})
+    qps = len(queries) / (time.perf_counter() - started)
+
+    labelled = [(ranking, relevant) for ranking, relevant in zip(rankings, labels) if relevant]
+    recall, hit_rate = {}, {}
+    for k in k_values:
+        recall[str(k)] = float(np.mean([
+            len(relevant.intersection(ranking[:k])) / len(relevant) for ranking, relevant in labelled
+        ])) if labelled else 0.0
+        hit_rate[str(k)] = float(np.mean([
+            bool(relevant.intersection(ranking[:k])) for ranking, relevant in labelled
+        ])) if labelled else 0.0
+
+    generation_latency = None
+    if generation_chain is not None:
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            generation_chain.invoke({"question": query})
+            timings.append(time.perf_counter() - started)
+        generation_latency = summarize_latencies(timings)
+
+    return RetrieverReport(
+        name=name,
+        latency_ms=summarize_latencies(latencies),
+        qps=qps,
+        recall_at_k=recall,
+        hit_rate_at_k=hit_rate,
+        labelled_questions=len(labelled),
+        mean_documents=float(np.mean([len(ranking) for ranking in rankings])),
+        generation_latency_ms=generation_latency,
+    )
+
+
+def run_benchmark(
+    corpus_path: str | Path = RAPTOR_CORPUS,
+    persist_directory: str | Path = BENCHMARK_VECTORS,
+    configs: Iterable[str] = tuple(RETRIEVER_CONFIGS),
+    question_sets: Iterable[str] = QUESTION_SETS,
+    qrels_path: str | Path | None = None,
+    k_values: Iterable[int] = (1, 5, 10),
+    repeats: int = 3,
+    concurrency: int = 8,
+    generate: bool = False,
+    min_coverage: float = 0.6,
+) -> BenchmarkReport:
+    from core.chains.raptor import build_rag_chain
+    from core.vectorstores.chroma import (
+        CHECKPOINT_FILENAME, LEXICAL_INDEX_FILENAME, create_vector_store_from_corpus, load_vector_store
+    )
+
+    started_at = time.time()
+    embeddings = HashingEmbeddings()
+    persist_directory = Path(persist_directory)
+    persist_directory.mkdir(parents=True, exist_ok=True)
+    rss = {"start": peak_rss_mb()}
+
+    # ingestion is incremental, so a populated store only times the cold build in a scratch directory
+    cached = (persist_directory / CHECKPOINT_FILENAME).exists()
+    cached_build_seconds = None
+    build_directory = tempfile.TemporaryDirectory() if cached else None
+    started = time.perf_counter()
+    create_vector_store_from_corpus(
+        embeddings, build_directory.name if cached else str(persist_directory), corpus_path
+    )
+    build_seconds = time.perf_counter() - started
+    if cached:
+        build_directory.cleanup()
+        started = time.perf_counter()
+        create_vector_store_from_corpus(embeddings, str(persist_directory), corpus_path)
+        cached_build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorstore = load_vector_store(embeddings, str(persist_directory))
+    vectorstore._collection.count()
+    load_seconds = {"chroma": time.perf_counter() - started}
+    started = time.perf_counter()
+    index = BM25Index.load(persist_directory / LEXICAL_INDEX_FILENAME)
+    load_seconds["bm25"] = time.perf_counter() - started
+    rss["after_load"] = peak_rss_mb()
+
+    questions = load_questions(question_sets=question_sets)
+    labels = load_qrels(qrels_path, questions) if qrels_path else silver_labels(questions, index, min_coverage)
+    llm = ExtractiveChatModel() if generate else None
+
+    reports = []
+    for name in configs:
+        retriever = RETRIEVER_CONFIGS[name](vectorstore, index)
+        generation_chain = build_rag_chain(llm, vectorstore, retriever=retriever) if llm is not None else None
+        report = benchmark_retriever(
+            name, retriever, questions, labels, k_values, repeats, concurrency, generation_chain
+        )
+        _logger.info(
+            "%-20s p50=%.1fms p95=%.1fms qps=%.1f recall@%s=%.3f",
+            name, report.latency_ms["p50"], report.latency_ms["p95"], report.qps,
+            max(report.recall_at_k, key=int), report.recall_at_k[max(report.recall_at_k, key=int)],
+        )
+        reports.append(report)
+    rss["end"] = peak_rss_mb()
+
+    return BenchmarkReport(
+        started_at=started_at,
+        corpus_chunks=len(index),
+        questions=len(questions),
+        label_source="qrels" if qrels_path else f"silver(min_coverage={min_coverage})",
+        build_seconds=build_seconds,
+        cached_build_seconds=cached_build_seconds,
+        index_load_seconds=load_seconds,
+        peak_rss_mb=rss,
+        settings={
+            "corpus": str(corpus_path),
+            "embeddings": embeddings.model,
+            "repeats": repeats,
+            "concurrency": concurrency,
+            "k_values": list(k_values),
+        },
+        retrievers=reports,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency and recall with local stand-in models")
+    parser.add_argument("--corpus", default=str(RAPTOR_CORPUS))
+    parser.add_argument("--persist-directory", default=str(BENCHMARK_VECTORS))
+    parser.add_argument("--configs", nargs="+", choices=list(RETRIEVER_CONFIGS), default=list(RETRIEVER_CONFIGS))
+    parser.add_argument("--question-sets", nargs="+", choices=QUESTION_SETS, default=list(QUESTION_SETS))
+    parser.add_argument("--qrels", help="JSON mapping question -> relevant chunk ids")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--min-coverage", type=float, default=0.6)
+    parser.add_argument("--generate", action="store_true", help="also time the RAG chain with the stand-in LLM")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    report = run_benchmark(
+        corpus_path=args.corpus,
+        persist_directory=args.persist_directory,
+        configs=args.configs,
+        question_sets=args.question_sets,
+        qrels_path=args.qrels,
+        k_values=args.k,
+        repeats=args.repeats,
+        concurrency=args.concurrency,
+        generate=args.generate,
+        min_coverage=args.min_coverage,
+    )
+    output = report.model_dump_json(indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
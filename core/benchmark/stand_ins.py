@@ -0,0 +1,62 @@
+"""Deterministic local stand-ins for the embedding model and the chat LLM.
+
+They make no network calls and always return the same output for the same input,
+so benchmark runs are comparable across machines and commits.
+"""
+import hashlib
+import re
+from typing import Any
+
+import numpy as np
+from langchain.chat_models.base import BaseChatModel
+from langchain.embeddings.base import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from core.retrievers.bm25 import tokenize
+
+
+class HashingEmbeddings(Embeddings):
+    """Signed feature hashing of unigrams and bigrams, L2 normalized."""
+
+    def __init__(self, dimension: int = 384) -> None:
+        self.dimension = dimension
+        self.model = f"hashing-{dimension}"
+
+    def _embed(self, text: str) -> list[float]:
+        tokens = tokenize(text)
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+class ExtractiveChatModel(BaseChatModel):
+    """Answers with the context sentences that share the most terms with the question."""
+
+    max_sentences: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return "extractive-stand-in"
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        prompt = str(messages[-1].content)
+        match = re.search(r"Question:\s*(.+)", prompt)
+        question = set(tokenize(match.group(1) if match else prompt[:200]))
+        context = prompt[match.end():] if match else prompt
+        sentences = [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+|\n+", context) if sentence.strip()]
+        ranked = sorted(sentences, key=lambda sentence: len(question.intersection(tokenize(sentence))), reverse=True)
+        answer = " ".join(ranked[:self.max_sentences]) or "I don't know."
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
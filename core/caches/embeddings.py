@@ -0,0 +1,200 @@
+import fcntl
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+
+def content_hash(text: str, kind: str) -> str:
+    return hashlib.sha256(f"{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+def model_namespace(embeddings: Embeddings) -> str:
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    name = f"{type(embeddings).__name__}-{model}" if model else type(embeddings).__name__
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+
+
+class MemoryMappedVectorStore:
+    """Append-only float32 matrix on disk, read through ``np.memmap``.
+
+    Row ``i`` of ``vectors.f32`` belongs to the key on line ``i`` of ``keys.txt``.
+    Several processes share one directory: appends hold an exclusive ``flock``
+    and pick up the other processes' rows first. Row numbers come from line
+    positions in ``keys.txt``, not from this instance's own bookkeeping.
+    Vectors are written before their key, so a crash can only leave orphan rows.
+    The next writer truncates them.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = directory / "vectors.f32"
+        self._keys_path = directory / "keys.txt"
+        self._meta_path = directory / "meta.json"
+        self._lock_path = directory / "lock"
+        self._lock = threading.Lock()
+        self._mmap: np.memmap | None = None
+
+        self.dim: int | None = None
+        self._rows: dict[str, int] = {}
+        self._line_count = 0
+        self._keys_offset = 0
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._sync()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @contextmanager
+    def _file_lock(self, operation: int):
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """Read the keys other processes appended since the last sync. Caller holds the file lock."""
+        if self.dim is None and self._meta_path.exists():
+            self.dim = json.loads(self._meta_path.read_text())["dim"]
+        if not self._keys_path.exists() or self._keys_path.stat().st_size == self._keys_offset:
+            return
+        with open(self._keys_path, "rb") as file:
+            file.seek(self._keys_offset)
+            for line in iter(file.readline, b""):
+                if not line.endswith(b"\n"):
+                    break
+                self._rows.setdefault(line.decode("utf-8").strip(), self._line_count)
+                self._line_count += 1
+                self._keys_offset += len(line)
+
+    def _matrix(self) -> np.ndarray:
+        if self._mmap is None or self._mmap.shape[0] < self._line_count:
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(self._line_count, self.dim)
+            )
+        return self._mmap
+
+    def get(self, key: str) -> list[float] | None:
+        with self._lock:
+            if key not in self._rows:
+                with self._file_lock(fcntl.LOCK_SH):
+                    self._sync()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return self._matrix()[row].tolist()
+
+    def put_many(self, items: list[tuple[str, list[float]]]) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._sync()
+            items = list({key: vector for key, vector in items if key not in self._rows}.items())
+            if not items:
+                return
+            if self.dim is None:
+                self.dim = len(items[0][1])
+                self._meta_path.write_text(json.dumps({"dim": self.dim}))
+            if self._keys_path.exists() and self._keys_path.stat().st_size != self._keys_offset:
+                # a torn key line from a crashed writer
+                with open(self._keys_path, "r+b") as file:
+                    file.truncate(self._keys_offset)
+            matrix = np.asarray([vector for _, vector in items], dtype=np.float32)
+            with open(self._vectors_path, "ab") as file:
+                file.truncate(self._line_count * self.dim * 4)
+                file.write(matrix.tobytes())
+            with open(self._keys_path, "ab") as file:
+                file.write("".join(f"{key}\n" for key, _ in items).encode("utf-8"))
+            self._sync()
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-hash keyed embedding cache around any ``Embeddings``.
+
+    Lookups go to an in-memory LRU first, then to a memory-mapped store kept in its
+    own directory per embedding model, and only misses reach the wrapped model.
+    Query and document embeddings are cached separately since some models embed
+    them differently.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        cache_dir: str | Path,
+        namespace: str | None = None,
+        memory_size: int = 4096,
+    ) -> None:
+        self.underlying = underlying
+        self.namespace = namespace or model_namespace(underlying)
+        self.memory_size = memory_size
+        self.disk = MemoryMappedVectorStore(Path(cache_dir) / self.namespace)
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> list[float] | None:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        vector = self.disk.get(key)
+        if vector is not None:
+            self._remember(key, vector)
+        return vector
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _store(self, keys: list[str], vectors: list[list[float]]) -> None:
+        for key, vector in zip(keys, vectors):
+            self._remember(key, vector)
+        self.disk.put_many(list(zip(keys, vectors)))
+
+    def _lookup_documents(self, texts: list[str]) -> tuple[list[str], dict[str, list[float] | None]]:
+        keys = [content_hash(text, "document") for text in texts]
+        found = {key: self._get(key) for key in keys}
+        return keys, found
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found = self._lookup_documents(texts)
+        missing = {key: text for key, text in zip(keys, texts) if found[key] is None}
+        if missing:
+            embedded = self.underlying.embed_documents(list(missing.values()))
+            self._store(list(missing), embedded)
+            found.update(zip(missing, embedded))
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, found = self._lookup_documents(texts)
+        missing = {key: text for key, text in zip(keys, texts) if found[key] is None}
+        if missing:
+            embedded = await self.underlying.aembed_documents(list(missing.values()))
+            self._store(list(missing), embedded)
+            found.update(zip(missing, embedded))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = content_hash(text, "query")
+        vector = self._get(key)
+        if vector is None:
+            vector = self.underlying.embed_query(text)
+            self._store([key], [vector])
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = content_hash(text, "query")
+        vector = self._get(key)
+        if vector is None:
+            vector = await self.underlying.aembed_query(text)
+            self._store([key], [vector])
+        return vector
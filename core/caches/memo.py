@@ -0,0 +1,83 @@
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class QuestionMemoStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+
+
+class QuestionMemo:
+    """In-process LRU of chain outputs keyed by the normalized question.
+
+    Concurrent async calls for the same question share one in-flight request.
+    """
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self.max_size = max_size
+        self.stats = QuestionMemoStats()
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True, self._entries[key]
+            return False, None
+
+    def _put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def wrap(self, chain: Runnable, name: str = "QuestionMemo") -> Runnable:
+        def invoke(inputs: dict, config: RunnableConfig) -> Any:
+            key = normalize_question(inputs["question"])
+            found, value = self._get(key)
+            if found:
+                self.stats.hits += 1
+                return value
+            self.stats.misses += 1
+            value = chain.invoke(inputs, config)
+            self._put(key, value)
+            return value
+
+        async def ainvoke(inputs: dict, config: RunnableConfig) -> Any:
+            key = normalize_question(inputs["question"])
+            found, value = self._get(key)
+            if found or key in self._in_flight:
+                self.stats.hits += 1
+                return value if found else await asyncio.shield(self._in_flight[key])
+            self.stats.misses += 1
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            try:
+                value = await chain.ainvoke(inputs, config)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as error:
+                future.set_exception(error)
+                future.exception()  # mark retrieved, waiting callers still get the error
+                raise
+            finally:
+                self._in_flight.pop(key, None)
+            self._put(key, value)
+            future.set_result(value)
+            return value
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=name)
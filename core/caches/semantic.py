@@ -0,0 +1,258 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain_core.callbacks.manager import adispatch_custom_event, dispatch_custom_event
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableGenerator
+from pydantic import BaseModel
+
+from core.retrievers.hybrid import is_citation_query
+
+_logger = logging.getLogger(__name__)
+
+CACHE_EVENT = "semantic_cache"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    question TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_by_question ON answers (namespace, question);
+"""
+
+
+class SemanticCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+def _question_of(inputs: dict | str) -> str:
+    return inputs["question"] if isinstance(inputs, dict) else inputs
+
+
+def _last(chunks: Iterator):
+    inputs = None
+    for inputs in chunks:
+        pass
+    return inputs
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """Answer cache keyed by question embedding and backed by a local SQLite file.
+
+    A stored answer is returned when a new question's cosine similarity to a cached
+    question in the same namespace reaches ``similarity_threshold``. Entries expire after
+    ``ttl_seconds`` and the least recently used ones are evicted above ``max_entries``.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        path: str | Path,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float | None = 7 * 24 * 60 * 60,
+        max_entries: int = 10_000,
+    ) -> None:
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = SemanticCacheStats()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._load()
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT id, namespace, embedding, created_at FROM answers ORDER BY id"
+        ).fetchall()
+        if rows:
+            # entries written with a different embedding model can't be compared, skip them
+            rows = [row for row in rows if len(row[2]) == len(rows[-1][2])]
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._namespaces = np.array([row[1] for row in rows], dtype=object)
+        self._created = np.array([row[3] for row in rows], dtype=np.float64)
+        self._vectors = (
+            np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+            if rows else None
+        )
+
+    def _expired(self, now: float) -> np.ndarray:
+        if self.ttl_seconds is None:
+            return np.zeros(len(self._ids), dtype=bool)
+        return self._created < now - self.ttl_seconds
+
+    def _search(self, vector: np.ndarray, namespace: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                return None
+            similarities = self._vectors @ vector
+            similarities[(self._namespaces != namespace) | self._expired(now)] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            entry_id = int(self._ids[best])
+            self._conn.execute("UPDATE answers SET accessed_at = ? WHERE id = ?", (now, entry_id))
+            self._conn.commit()
+            row = self._conn.execute("SELECT answer FROM answers WHERE id = ?", (entry_id,)).fetchone()
+        return row[0] if row else None
+
+    def _exact(self, question: str, namespace: str) -> str | None:
+        now = time.time()
+        oldest = now - self.ttl_seconds if self.ttl_seconds is not None else -np.inf
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, answer FROM answers WHERE namespace = ? AND question = ? AND created_at >= ? "
+                "ORDER BY id DESC LIMIT 1",
+                (namespace, question, oldest),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE answers SET accessed_at = ? WHERE id = ?", (now, row[0]))
+            self._conn.commit()
+        return row[1]
+
+    def _put(self, question: str, vector: np.ndarray, answer: str, namespace: str) -> None:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (namespace, question, embedding, answer, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, question, vector.tobytes(), answer, now, now),
+            )
+            if self.ttl_seconds is not None:
+                self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM answers WHERE id NOT IN "
+                "(SELECT id FROM answers ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+            if self._vectors is not None and self._vectors.shape[1] != vector.shape[0]:
+                self._load()
+                return
+            self._ids = np.append(self._ids, cursor.lastrowid)
+            self._namespaces = np.append(self._namespaces, np.array([namespace], dtype=object))
+            self._created = np.append(self._created, now)
+            self._vectors = vector[None, :] if self._vectors is None else np.vstack([self._vectors, vector])
+            kept = np.isin(self._ids, [row[0] for row in self._conn.execute("SELECT id FROM answers")])
+            if not kept.all():
+                self._ids = self._ids[kept]
+                self._namespaces = self._namespaces[kept]
+                self._created = self._created[kept]
+                self._vectors = self._vectors[kept] if kept.any() else None
+
+    def _record(self, answer: str | None) -> None:
+        if answer is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        _logger.debug(
+            "Semantic cache %s, hit rate %.2f over %d lookups",
+            "miss" if answer is None else "hit", self.stats.hit_rate, self.stats.lookups
+        )
+
+    def _lookup(self, question: str, namespace: str) -> tuple[str | None, np.ndarray | None]:
+        """Exact question match first. Citation queries stop there: they are cheap to answer
+        lexically and near-identical citations ("5/12-3" and "5/12-4") must not share answers."""
+        answer = self._exact(question, namespace)
+        if answer is not None or is_citation_query(question):
+            return answer, None
+        vector = _normalize(self.embeddings.embed_query(question))
+        return self._search(vector, namespace), vector
+
+    async def _alookup(self, question: str, namespace: str) -> tuple[str | None, np.ndarray | None]:
+        answer = self._exact(question, namespace)
+        if answer is not None or is_citation_query(question):
+            return answer, None
+        vector = _normalize(await self.embeddings.aembed_query(question))
+        return self._search(vector, namespace), vector
+
+    def lookup(self, question: str, namespace: str = "default") -> str | None:
+        answer, _ = self._lookup(question, namespace)
+        self._record(answer)
+        return answer
+
+    def update(self, question: str, answer: str, namespace: str = "default") -> None:
+        self._put(question, _normalize(self.embeddings.embed_query(question)), answer, namespace)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._load()
+
+    def wrap(self, chain: Runnable, namespace: str) -> Runnable:
+        """Put the cache in front of a chain answering ``{"question": ...}`` with a string.
+
+        The wrapper streams: a hit is emitted as one chunk, a miss streams the chain's
+        chunks through and caches the joined answer once the stream completes.
+        """
+
+        def transform(chunks: Iterator[dict | str], config: RunnableConfig) -> Iterator[str]:
+            inputs = _last(chunks)
+            question = _question_of(inputs)
+            answer, vector = self._lookup(question, namespace)
+            self._record(answer)
+            dispatch_custom_event(CACHE_EVENT, {"namespace": namespace, "hit": answer is not None}, config=config)
+            if answer is not None:
+                yield answer
+                return
+            parts = []
+            for part in chain.stream(inputs, config):
+                parts.append(part)
+                yield part
+            if vector is None:
+                vector = _normalize(self.embeddings.embed_query(question))
+            self._put(question, vector, "".join(parts), namespace)
+
+        async def atransform(chunks: AsyncIterator[dict | str], config: RunnableConfig) -> AsyncIterator[str]:
+            inputs = None
+            async for inputs in chunks:
+                pass
+            question = _question_of(inputs)
+            answer, vector = await self._alookup(question, namespace)
+            self._record(answer)
+            await adispatch_custom_event(CACHE_EVENT, {"namespace": namespace, "hit": answer is not None}, config=config)
+            if answer is not None:
+                yield answer
+                return
+            parts = []
+            async for part in chain.astream(inputs, config):
+                parts.append(part)
+                yield part
+            if vector is None:
+                vector = _normalize(await self.embeddings.aembed_query(question))
+            self._put(question, vector, "".join(parts), namespace)
+
+        return RunnableGenerator(transform, atransform, name=f"SemanticCache[{namespace}]")
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    verdict TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def verdict_key(question: str, answer: str, judge_prompt: str) -> str:
+    payload = json.dumps([question, answer, judge_prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """Judge verdicts keyed by (question, answer, judge prompt), stored in a local SQLite file.
+
+    The judge prompt is part of the key, so editing the prompt or switching the judge
+    model invalidates old verdicts without clearing the file.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, verdict: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(verdict), time.time()),
+            )
+            self._conn.commit()
@@ -0,0 +1,146 @@
+"""Bounded conversation context for follow-up questions.
+
+The last ``max_turns`` turns are kept verbatim. Older turns are folded into a rolling
+summary, one LLM call per fold, and only over the messages that are new since the
+last fold. The summary and the verbatim turns must fit a per-model token budget
+together, so the prompt does not grow with the length of the session. The context is
+stored with the conversation and folded in the background, see ``ConversationHistory.fold_context``.
+"""
+from typing import Final
+
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema.runnable import Runnable
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from pydantic import BaseModel, ConfigDict
+
+from core.history.store import ConversationContext
+from core.tokens import count_tokens, truncate_tokens
+
+CONTEXT_TOKEN_BUDGETS: Final[dict[str, int]] = {
+    "gpt-4o": 6000,
+    "gpt-4o-mini": 4000,
+    "gemini-1.5-pro": 8000,
+}
+DEFAULT_CONTEXT_TOKEN_BUDGET: Final[int] = 4000
+
+SUMMARY_PROMPT: Final[str] = """
+Progressively summarize a conversation between a user and a legal assistant.
+Extend the current summary with the new lines and return only the new summary.
+Keep names, jurisdictions, dates, amounts, cited statutes and what the user is trying to achieve;
+drop greetings and filler. Stay under {max_words} words.
+"""
+
+CONDENSE_PROMPT: Final[str] = """
+Given a summary of a conversation, its most recent turns and a follow-up question,
+rewrite the follow-up into a standalone question that can be understood without the conversation.
+Resolve pronouns and references, keep the user's language, and return the question unchanged if it
+already stands on its own. Return only the question.
+"""
+
+
+def build_summary_chain(llm: BaseChatModel) -> Runnable:
+    template = ChatPromptTemplate.from_messages([
+        ("system", SUMMARY_PROMPT),
+        ("human", "Current summary:\n{summary}\n\nNew lines:\n{lines}\n\nNew summary:"),
+    ])
+    return template | llm | StrOutputParser()
+
+
+def build_condense_question_chain(llm: BaseChatModel) -> Runnable:
+    template = ChatPromptTemplate.from_messages([
+        ("system", CONDENSE_PROMPT),
+        ("human", "Summary:\n{summary}\n\nRecent turns:\n{turns}\n\nFollow-up question: {question}\n\n"
+                  "Standalone question:"),
+    ])
+    return template | llm | StrOutputParser()
+
+
+def context_token_budget(llm: BaseChatModel) -> int:
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or ""
+    return CONTEXT_TOKEN_BUDGETS.get(str(model).removeprefix("models/"), DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+
+def _format_turns(messages: list[dict]) -> str:
+    return "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+
+class ContextWindowManager(BaseModel):
+    """Builds the history sent with each question from chat messages carrying a ``seq``.
+
+    Messages without a ``seq`` (the greeting) are not part of the conversation.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    summarizer: Runnable
+    condenser: Runnable
+    max_turns: int = 3
+    token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET
+    summary_max_tokens: int = 500
+
+    def window(self, context: ConversationContext, messages: list[dict]) -> tuple[list[dict], list[dict]]:
+        """Split the unsummarized messages into those to fold and those kept verbatim."""
+        unsummarized = [m for m in messages if m.get("seq") is not None and m["seq"] > context.summarized_seq]
+        recent = unsummarized[-2 * self.max_turns:]
+        available = self.token_budget - self.summary_max_tokens
+        used = 0
+        for kept, message in enumerate(reversed(recent)):
+            used += count_tokens(str(message["content"]))
+            if used > available:
+                recent = recent[len(recent) - kept:]
+                break
+        return unsummarized[:len(unsummarized) - len(recent)], recent
+
+    def update(
+        self, context: ConversationContext, messages: list[dict], config: RunnableConfig | None = None
+    ) -> ConversationContext:
+        to_fold, _ = self.window(context, messages)
+        if not to_fold:
+            return context
+        summary = self.summarizer.invoke({
+            "summary": context.summary or "(empty)",
+            "lines": truncate_tokens(_format_turns(to_fold), self.token_budget),
+            "max_words": self.summary_max_tokens * 3 // 4,
+        }, config)
+        return ConversationContext(
+            summary=truncate_tokens(summary.strip(), self.summary_max_tokens),
+            summarized_seq=to_fold[-1]["seq"],
+        )
+
+    def history(self, context: ConversationContext, messages: list[dict]) -> list[BaseMessage]:
+        _, recent = self.window(context, messages)
+        history: list[BaseMessage] = []
+        if context.summary:
+            history.append(SystemMessage(f"Summary of the earlier conversation:\n{context.summary}"))
+        for message in recent:
+            message_type = HumanMessage if message["role"] == "user" else AIMessage
+            history.append(message_type(str(message["content"])))
+        return history
+
+    def standalone_question(
+        self,
+        context: ConversationContext,
+        messages: list[dict],
+        question: str,
+        config: RunnableConfig | None = None,
+    ) -> str:
+        _, recent = self.window(context, messages)
+        if not recent and not context.summary:
+            return question
+        standalone = self.condenser.invoke({
+            "summary": context.summary or "(empty)",
+            "turns": _format_turns(recent),
+            "question": question,
+        }, config)
+        return standalone.strip() or question
+
+
+def build_context_manager(llm: BaseChatModel, max_turns: int = 3) -> ContextWindowManager:
+    return ContextWindowManager(
+        summarizer=build_summary_chain(llm),
+        condenser=build_condense_question_chain(llm),
+        max_turns=max_turns,
+        token_budget=context_token_budget(llm),
+    )
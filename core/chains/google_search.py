@@ -1,9 +1,16 @@
+import os
+from operator import itemgetter
+from typing import AsyncIterator
+
 from langchain.chat_models.base import BaseChatModel
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.runnables import RunnableLambda
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import Runnable
+
+from core.caches.semantic import SemanticCache
+from core.constants import WEB_SEARCH_FIXTURES_ENV
+from core.retrievers.web_search import build_web_search_retriever
 
 
 PROMPT = """
@@ -16,33 +23,36 @@ Question: {question}
 """
 
 
-def get_google_search_results(inputs: dict) -> str:
-    from langchain_community.utilities import SerpAPIWrapper
-    wrapper = SerpAPIWrapper()
-    return wrapper.run(inputs["question"])
-
-
 def build_google_search_retriever() -> BaseRetriever:
-    return
+    return build_web_search_retriever(fixtures=os.environ.get(WEB_SEARCH_FIXTURES_ENV))
 
 
 def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+    return "\n\n".join(f"{doc.page_content}\nSource: {doc.metadata.get('source', '')}" for doc in docs)
 
 
-def build_search_chain(llm: BaseChatModel, search_retriever: BaseRetriever):
+def build_search_chain(
+    llm: BaseChatModel,
+    search_retriever: BaseRetriever,
+    cache: SemanticCache | None = None,
+):
     prompt = ChatPromptTemplate.from_messages(
         [
             ("human", PROMPT)
         ]
     )
-    return (
-        {"context": RunnableLambda(get_google_search_results), "question": RunnablePassthrough()}
+    chain = (
+        {"context": itemgetter("question") | search_retriever | format_docs, "question": itemgetter("question")}
         | prompt
         | llm
         | StrOutputParser()
     )
+    return cache.wrap(chain, "google_search") if cache is not None else chain
 
 
 def retrieve_answer_from_google(chain: BaseChatModel, question: str):
     return chain.ainvoke({"question": question})
+
+
+def stream_answer_from_google(chain: Runnable, question: str) -> AsyncIterator[str]:
+    return chain.astream({"question": question})
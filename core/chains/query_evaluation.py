@@ -1,11 +1,12 @@
 from enum import Enum
+from functools import lru_cache
 from typing import Final
 
 from langchain.chat_models.base import BaseChatModel
 from langchain.schema.runnable import Runnable
-from langchain_core.messages import HumanMessage
 from langchain_core.output_parsers import JsonOutputToolsParser
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from pydantic import BaseModel, Field
 
 
@@ -96,12 +97,39 @@ Question:
 """
 
 
+@lru_cache(maxsize=None)
+def evaluation_tool() -> dict:
+    return convert_to_openai_tool(QuestionEvaluation)
+
+
 def build_evaluate_question_chain(llm: BaseChatModel) -> Runnable:
-    llm_with_tools = llm.bind_tools([QuestionEvaluation], tool_choice=QuestionEvaluation.__name__)
-    template = ChatPromptTemplate.from_messages([HumanMessage(content=PROMPT)])
+    llm_with_tools = llm.bind_tools([evaluation_tool()], tool_choice=QuestionEvaluation.__name__)
+    template = ChatPromptTemplate.from_messages([("human", PROMPT)])
     return template | llm_with_tools | JsonOutputToolsParser()
 
 
+def evaluation_labels(output: list[dict]) -> dict[str, str]:
+    evaluation = QuestionEvaluation.model_validate(output[0]["args"])
+    return {
+        "category": evaluation.category.value,
+        "is_rag_useful": str(evaluation.is_rag_useful).lower(),
+        "difficulty_response": evaluation.difficulty_response.value,
+        "is_illinois_law": str(evaluation.is_illinois_law).lower(),
+    }
+
+
+def evaluation_from_labels(labels: dict[str, str], confidence: float) -> list[dict]:
+    """Same shape as the chain output, for decisions made by the local classifier."""
+    args = {
+        "category": labels["category"],
+        "is_rag_useful": labels["is_rag_useful"] == "true",
+        "difficulty_response": labels["difficulty_response"],
+        "reasoning_about_difficulty": f"Decided by the local classifier with confidence {confidence:.2f}.",
+        "is_illinois_law": labels["is_illinois_law"] == "true",
+    }
+    return [{"args": args, "type": QuestionEvaluation.__name__}]
+
+
 async def evaluate_question(chain: Runnable, question: str) -> QuestionEvaluation:
     answer = (await chain.ainvoke({"question": question}))[0]["args"]
     return QuestionEvaluation.model_validate(answer)
@@ -1,13 +1,19 @@
-from langchain_core.messages import HumanMessage
+from operator import itemgetter
+from typing import Iterator
+
 from langchain.chat_models.base import BaseChatModel
 from langchain.schema.output_parser import StrOutputParser
-from langchain.schema.runnable import RunnablePassthrough, Runnable
+from langchain.schema.runnable import Runnable
+from langchain_core.retrievers import BaseRetriever
 from langchain.vectorstores import VectorStore
 from langchain_core.prompts import ChatPromptTemplate
 
+from core.caches.semantic import SemanticCache
+from core.retrievers.raptor import RaptorRetriever
+
 
 RAG_PROMPT: ChatPromptTemplate = ChatPromptTemplate.from_messages([
-    HumanMessage(content="""
+    ("human", """
 You are an assistant for question-answering tasks. 
 Use the following pieces of retrieved context to answer the question. 
 Then, in a new line to list the reference, briefly tells 
@@ -19,20 +25,32 @@ If you don't know the answer, just say that you don't know.
 ])
 
 
+def format_docs(docs):
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
 def build_rag_chain(
     llm_model: BaseChatModel,
-    vectorstore: VectorStore
+    vectorstore: VectorStore,
+    cache: SemanticCache | None = None,
+    retriever: BaseRetriever | None = None,
 ):
-    return (
+    retriever = retriever or RaptorRetriever(vectorstore=vectorstore)
+    chain = (
         {
-            "context": vectorstore.as_retriever(search_kwargs={"k": 12}),
-            "question": RunnablePassthrough()
+            "context": itemgetter("question") | retriever | format_docs,
+            "question": itemgetter("question")
         }
         | RAG_PROMPT
         | llm_model
         | StrOutputParser()
     )
+    return cache.wrap(chain, "rag") if cache is not None else chain
 
 
 def generate_answer(chain: Runnable, question: str) -> str:
     return chain.invoke({"question": question})
+
+
+def stream_answer(chain: Runnable, question: str) -> Iterator[str]:
+    return chain.stream({"question": question})
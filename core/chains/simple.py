@@ -1,7 +1,26 @@
+from typing import Iterator
+
 from langchain.chat_models.base import BaseChatModel
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+
+def generate_answer(
+    llm_model: BaseChatModel,
+    question: str,
+    config: RunnableConfig | None = None,
+    history: list[BaseMessage] | None = None,
+) -> str:
+    messages = [*(history or []), HumanMessage(question)]
+    return llm_model.invoke(messages, config).content
 
 
-def generate_answer(llm_model: BaseChatModel, question: str) -> str:
-    messages = [HumanMessage(question)]
-    return llm_model.invoke(messages).content
+def stream_answer(
+    llm_model: BaseChatModel,
+    question: str,
+    config: RunnableConfig | None = None,
+    history: list[BaseMessage] | None = None,
+) -> Iterator[str]:
+    messages = [*(history or []), HumanMessage(question)]
+    for chunk in llm_model.stream(messages, config):
+        yield chunk.content
@@ -0,0 +1,275 @@
+"""Local classifier tier in front of LLM classification chains.
+
+Every decision the LLM makes is logged with the question embedding. Per task and
+label field, a nearest-centroid classifier is fitted on that log. Questions it
+classifies with enough confidence are answered locally in milliseconds; the rest fall
+back to the LLM, and those answers become new training data. A small share of
+confident cases is still sent to the LLM ("shadowed") so agreement keeps being measured.
+"""
+import argparse
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+from core.constants import DECISIONS_LOG_PATH
+
+_logger = logging.getLogger(__name__)
+
+Labels = dict[str, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    question TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    labels TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class NearestCentroidClassifier:
+    """Cosine nearest centroid with a softmax confidence over the class similarities."""
+
+    def __init__(self, temperature: float = 0.05, min_examples: int = 5) -> None:
+        self.temperature = temperature
+        self.min_examples = min_examples
+        self.classes: list[str] = []
+        self.centroids: np.ndarray | None = None
+
+    def fit(self, vectors: np.ndarray, labels: list[str]) -> "NearestCentroidClassifier":
+        labels = np.asarray(labels, dtype=object)
+        self.classes = [
+            label for label in sorted(set(labels)) if (labels == label).sum() >= self.min_examples
+        ]
+        self.centroids = (
+            np.vstack([_normalize(vectors[labels == label].mean(axis=0)) for label in self.classes])
+            if self.classes else None
+        )
+        return self
+
+    def predict(self, vector: np.ndarray) -> tuple[str | None, float]:
+        # a single known class says nothing about how separable the others are
+        if self.centroids is None or len(self.classes) < 2:
+            return None, 0.0
+        logits = self.centroids @ vector / self.temperature
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        return self.classes[best], float(probabilities[best])
+
+
+class LocalClassifierStats(BaseModel):
+    local: int = 0
+    fallbacks: int = 0
+    shadowed: int = 0
+    compared: int = 0
+    agreements: int = 0
+
+    @property
+    def local_rate(self) -> float:
+        total = self.local + self.fallbacks + self.shadowed
+        return self.local / total if total else 0.0
+
+    @property
+    def agreement_rate(self) -> float:
+        return self.agreements / self.compared if self.compared else 0.0
+
+
+class LocalClassifierTier:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        path: str | Path = DECISIONS_LOG_PATH,
+        confidence_threshold: float = 0.9,
+        shadow_rate: float = 0.05,
+        refit_every: int = 20,
+        temperature: float = 0.05,
+        min_examples: int = 5,
+    ) -> None:
+        self.embeddings = embeddings
+        self.confidence_threshold = confidence_threshold
+        self.shadow_rate = shadow_rate
+        self.refit_every = refit_every
+        self.temperature = temperature
+        self.min_examples = min_examples
+        self.stats: dict[str, LocalClassifierStats] = {}
+        self._models: dict[str, dict[str, NearestCentroidClassifier]] = {}
+        self._pending: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def _decisions(self, task: str) -> tuple[np.ndarray, list[Labels]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT embedding, labels FROM decisions WHERE task = ? ORDER BY id", (task,)
+            ).fetchall()
+        if rows:
+            rows = [row for row in rows if len(row[0]) == len(rows[-1][0])]
+        vectors = np.vstack([np.frombuffer(row[0], dtype=np.float32) for row in rows]) if rows else np.zeros((0, 0))
+        return vectors, [json.loads(row[1]) for row in rows]
+
+    def _fit_models(self, vectors: np.ndarray, labels: list[Labels]) -> dict[str, NearestCentroidClassifier]:
+        fields = sorted({field for item in labels for field in item})
+        return {
+            field: NearestCentroidClassifier(self.temperature, self.min_examples).fit(
+                vectors, [item.get(field, "") for item in labels]
+            )
+            for field in fields
+        }
+
+    def refit(self, task: str) -> None:
+        vectors, labels = self._decisions(task)
+        models = self._fit_models(vectors, labels) if labels else {}
+        with self._lock:
+            self._models[task], self._pending[task] = models, 0
+
+    def _log(self, task: str, question: str, vector: np.ndarray, labels: Labels) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO decisions (task, question, embedding, labels, created_at) VALUES (?, ?, ?, ?, ?)",
+                (task, question, vector.tobytes(), json.dumps(labels), time.time()),
+            )
+            self._conn.commit()
+            self._pending[task] = self._pending.get(task, 0) + 1
+            stale = self._pending[task] >= self.refit_every
+        if stale:
+            self.refit(task)
+
+    def predict(self, task: str, vector: np.ndarray) -> tuple[Labels | None, float]:
+        """Labels for every field and the lowest field confidence, ``None`` if any field is unknown."""
+        if task not in self._models:
+            self.refit(task)
+        models = self._models[task]
+        if not models:
+            return None, 0.0
+        labels, confidence = {}, 1.0
+        for field, model in models.items():
+            label, probability = model.predict(vector)
+            if label is None:
+                return None, 0.0
+            labels[field], confidence = label, min(confidence, probability)
+        return labels, confidence
+
+    def _route(self, task: str, vector: np.ndarray) -> tuple[Labels | None, float, bool]:
+        predicted, confidence = self.predict(task, vector)
+        local = predicted is not None and confidence >= self.confidence_threshold
+        shadow = local and random.random() < self.shadow_rate
+        return predicted, confidence, local and not shadow
+
+    def _record(self, task: str, question: str, vector: np.ndarray, predicted: Labels | None,
+                confidence: float, labels: Labels) -> None:
+        stats = self.stats.setdefault(task, LocalClassifierStats())
+        if predicted is not None and confidence >= self.confidence_threshold:
+            stats.shadowed += 1
+        else:
+            stats.fallbacks += 1
+        if predicted is not None:
+            stats.compared += 1
+            stats.agreements += predicted == labels
+        self._log(task, question, vector, labels)
+
+    def wrap(
+        self,
+        chain: Runnable,
+        task: str,
+        to_labels: Callable[[object], Labels],
+        from_labels: Callable[[Labels, float], object],
+    ) -> Runnable:
+        """Put the local tier in front of a chain taking ``{"question": ...}``.
+
+        ``to_labels`` turns the chain output into string labels per field and
+        ``from_labels`` builds an output of the same shape from local labels.
+        """
+
+        def invoke(inputs: dict, config: RunnableConfig) -> object:
+            question = inputs["question"]
+            vector = _normalize(self.embeddings.embed_query(question))
+            predicted, confidence, local = self._route(task, vector)
+            if local:
+                self.stats.setdefault(task, LocalClassifierStats()).local += 1
+                return from_labels(predicted, confidence)
+            output = chain.invoke(inputs, config)
+            self._record(task, question, vector, predicted, confidence, to_labels(output))
+            return output
+
+        async def ainvoke(inputs: dict, config: RunnableConfig) -> object:
+            question = inputs["question"]
+            vector = _normalize(await self.embeddings.aembed_query(question))
+            predicted, confidence, local = self._route(task, vector)
+            if local:
+                self.stats.setdefault(task, LocalClassifierStats()).local += 1
+                return from_labels(predicted, confidence)
+            output = await chain.ainvoke(inputs, config)
+            self._record(task, question, vector, predicted, confidence, to_labels(output))
+            return output
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"LocalClassifier[{task}]")
+
+    def tasks(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT task FROM decisions ORDER BY task")]
+
+    def evaluate(self, task: str, thresholds: Iterable[float] = (0.5, 0.7, 0.8, 0.9, 0.95), folds: int = 5) -> dict:
+        """Cross-validated coverage and agreement with the logged LLM decisions per threshold."""
+        vectors, labels = self._decisions(task)
+        folds = min(folds, len(labels))
+        predictions: list[tuple[Labels | None, float]] = []
+        order = np.arange(len(labels)) % max(folds, 1)
+        for fold in range(folds):
+            train, test = order != fold, np.flatnonzero(order == fold)
+            models = self._fit_models(vectors[train], [labels[i] for i in np.flatnonzero(train)])
+            for i in test:
+                predicted, confidence = {}, 1.0
+                for field, model in models.items():
+                    label, probability = model.predict(vectors[i])
+                    if label is None:
+                        predicted = None
+                        break
+                    predicted[field], confidence = label, min(confidence, probability)
+                predictions.append((predicted, confidence if predicted else 0.0))
+        truth = [labels[i] for fold in range(folds) for i in np.flatnonzero(order == fold)]
+        report = {"decisions": len(labels), "thresholds": {}}
+        for threshold in thresholds:
+            confident = [(p, t) for (p, c), t in zip(predictions, truth) if p is not None and c >= threshold]
+            report["thresholds"][str(threshold)] = {
+                "coverage": len(confident) / len(truth) if truth else 0.0,
+                "agreement": float(np.mean([p == t for p, t in confident])) if confident else None,
+            }
+        return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Report how well the local classifier agrees with logged LLM decisions")
+    parser.add_argument("--path", default=str(DECISIONS_LOG_PATH))
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    tier = LocalClassifierTier(embeddings=None, path=args.path)
+    report = {task: tier.evaluate(task, args.thresholds, args.folds) for task in tier.tasks()}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
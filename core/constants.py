@@ -7,3 +7,15 @@ LOCATION_ID: Final[str] = "us-central1"
 PROJECT_ROOT: Final[Path] = Path(__file__).parents[1]
 CHROMA_VECTORS: Final[Path] = PROJECT_ROOT / "chroma_vector_store"
 DOTENV_PATH: Final[Path] = PROJECT_ROOT / ".env"
+SEMANTIC_CACHE_PATH: Final[Path] = PROJECT_ROOT / "semantic_cache.sqlite3"
+EMBEDDINGS_CACHE: Final[Path] = PROJECT_ROOT / "embeddings_cache"
+RAPTOR_CORPUS: Final[Path] = PROJECT_ROOT / "raptor_corpus.jsonl"
+BENCHMARKS: Final[Path] = PROJECT_ROOT / "Benchmark"
+BENCHMARK_VECTORS: Final[Path] = PROJECT_ROOT / "benchmark_vector_store"
+VERDICT_CACHE_PATH: Final[Path] = PROJECT_ROOT / "judge_verdicts.sqlite3"
+EVALUATION_RESULTS: Final[Path] = PROJECT_ROOT / "evaluation_results.jsonl"
+METRICS_PORT_ENV: Final[str] = "LEXLEAD_METRICS_PORT"
+DECISIONS_LOG_PATH: Final[Path] = PROJECT_ROOT / "llm_decisions.sqlite3"
+WEB_SEARCH_FIXTURES_ENV: Final[str] = "LEXLEAD_WEB_SEARCH_FIXTURES"
+CHAT_HISTORY_PATH: Final[Path] = PROJECT_ROOT / "chat_history.sqlite3"
+CHAT_HISTORY_ENV: Final[str] = "LEXLEAD_CHAT_HISTORY"
@@ -0,0 +1,54 @@
+"""Near-duplicate detection with MinHash signatures over word shingles."""
+import hashlib
+import re
+from typing import Final, Sequence
+
+import numpy as np
+
+MERSENNE_PRIME: Final[int] = (1 << 31) - 1
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> set[str]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """Universal hashing ``(a * x + b) mod p`` approximating ``num_perm`` random permutations."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1) -> None:
+        rng = np.random.default_rng(seed)
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.int64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.int64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashed = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+             for s in shingles(text, self.shingle_size)],
+            dtype=np.int64,
+        )
+        if hashed.size == 0:
+            return np.full(self._a.shape[0], MERSENNE_PRIME, dtype=np.int64)
+        return ((self._a * hashed[None, :] + self._b) % MERSENNE_PRIME).min(axis=1)
+
+
+def estimated_jaccard(first: np.ndarray, second: np.ndarray) -> float:
+    return float(np.mean(first == second))
+
+
+def near_duplicates(texts: Sequence[str], threshold: float = 0.8, hasher: MinHasher | None = None) -> list[int]:
+    """Indexes of texts that are near duplicates of an earlier text, which is the one kept."""
+    hasher = hasher or MinHasher()
+    signatures = np.vstack([hasher.signature(text) for text in texts]) if texts else np.zeros((0, 0))
+    kept: list[int] = []
+    duplicates = []
+    for idx in range(len(texts)):
+        if kept and (signatures[kept] == signatures[idx]).mean(axis=1).max() >= threshold:
+            duplicates.append(idx)
+        else:
+            kept.append(idx)
+    return duplicates
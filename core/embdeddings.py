@@ -1,10 +1,16 @@
+from langchain.embeddings.base import Embeddings
 from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain_google_vertexai.embeddings import VertexAIEmbeddings
 
+from core.caches.embeddings import CachedEmbeddings
+from core.constants import EMBEDDINGS_CACHE
 
-def get_embeddings() -> OpenAIEmbeddings:
-    return OpenAIEmbeddings()
 
+def get_embeddings(cached: bool = True) -> Embeddings:
+    embeddings = OpenAIEmbeddings()
+    return CachedEmbeddings(embeddings, EMBEDDINGS_CACHE) if cached else embeddings
 
-def get_vertex_ai_embeddings() -> VertexAIEmbeddings:
-    return VertexAIEmbeddings(model_name="text-embedding-004")
+
+def get_vertex_ai_embeddings(cached: bool = True) -> Embeddings:
+    embeddings = VertexAIEmbeddings(model_name="text-embedding-004")
+    return CachedEmbeddings(embeddings, EMBEDDINGS_CACHE) if cached else embeddings
@@ -0,0 +1,536 @@
+"""Persistent chat history.
+
+``ConversationStore`` is the backend interface. There are two local backends: SQLite and
+an append-only JSONL log. A remote backend such as Firestore or BigQuery only has to
+implement the same seven methods. Chat turns never wait on the backend:
+``ConversationHistory`` queues messages and a background thread writes them in
+batches, and the rolling summary is folded and saved in the background too.
+History is read back one page at a time, newest first.
+"""
+import argparse
+import atexit
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+from pydantic import BaseModel, Field
+
+from core.constants import CHAT_HISTORY_ENV, CHAT_HISTORY_PATH
+
+_logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS conversations_by_user ON conversations (user_id, updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT NOT NULL UNIQUE,
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+CREATE TABLE IF NOT EXISTS contexts (
+    conversation_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    summarized_seq INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class ChatMessage(BaseModel):
+    """``seq`` is assigned by the store when the message is written, ``message_id`` makes retried writes idempotent."""
+    conversation_id: str
+    user_id: str
+    role: str
+    content: str
+    message_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    seq: int | None = None
+    created_at: float = Field(default_factory=time.time)
+
+
+class ConversationContext(BaseModel):
+    """Rolling summary of a conversation's messages up to and including ``summarized_seq``."""
+    summary: str = ""
+    summarized_seq: int = -1
+
+
+class ConversationStore(ABC):
+    @abstractmethod
+    def write_batch(self, messages: list[ChatMessage]) -> None:
+        """Append messages in order, numbering each after the last stored message of its conversation.
+
+        Messages whose ``message_id`` is already stored are skipped.
+        """
+
+    @abstractmethod
+    def load_page(self, conversation_id: str, before_seq: int | None = None, limit: int = 20) -> list[ChatMessage]:
+        """Up to ``limit`` messages older than ``before_seq``, oldest first."""
+
+    @abstractmethod
+    def latest_conversation(self, user_id: str) -> str | None:
+        ...
+
+    @abstractmethod
+    def save_context(self, conversation_id: str, context: ConversationContext) -> None:
+        """Store ``context`` unless the stored one already summarizes as far."""
+
+    @abstractmethod
+    def load_context(self, conversation_id: str) -> ConversationContext | None:
+        ...
+
+    @abstractmethod
+    def delete(self, conversation_id: str) -> None:
+        """Mark a conversation deleted. Its messages are removed by ``compact``."""
+
+    @abstractmethod
+    def compact(self, retention_days: float | None = None) -> int:
+        """Drop deleted conversations and those idle for longer than ``retention_days``.
+
+        Returns the number of conversations removed.
+        """
+
+
+class SQLiteConversationStore(ConversationStore):
+    def __init__(self, path: str | Path) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def write_batch(self, messages: list[ChatMessage]) -> None:
+        with self._lock, self._conn:
+            # take the write lock before reading max(seq), so concurrent writers can't pick the same seq
+            self._conn.execute("BEGIN IMMEDIATE")
+            for m in messages:
+                if self._conn.execute("SELECT 1 FROM messages WHERE message_id = ?", (m.message_id,)).fetchone():
+                    continue
+                self._conn.execute(
+                    "INSERT INTO messages (message_id, conversation_id, seq, role, content, created_at) "
+                    "SELECT ?, ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ? FROM messages WHERE conversation_id = ?",
+                    (m.message_id, m.conversation_id, m.role, m.content, m.created_at, m.conversation_id),
+                )
+            self._conn.executemany(
+                "INSERT INTO conversations (conversation_id, user_id, started_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET updated_at = max(updated_at, excluded.updated_at)",
+                [(m.conversation_id, m.user_id, m.created_at, m.created_at) for m in messages],
+            )
+
+    def load_page(self, conversation_id: str, before_seq: int | None = None, limit: int = 20) -> list[ChatMessage]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.seq, m.role, m.content, m.created_at, m.message_id, c.user_id FROM messages m "
+                "JOIN conversations c USING (conversation_id) "
+                "WHERE m.conversation_id = ? AND m.seq < ? AND c.deleted = 0 ORDER BY m.seq DESC LIMIT ?",
+                (conversation_id, before_seq if before_seq is not None else 2**62, limit),
+            ).fetchall()
+        return [
+            ChatMessage(conversation_id=conversation_id, user_id=user_id, seq=seq, role=role, content=content,
+                        message_id=message_id, created_at=created_at)
+            for seq, role, content, created_at, message_id, user_id in reversed(rows)
+        ]
+
+    def latest_conversation(self, user_id: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT conversation_id FROM conversations WHERE user_id = ? AND deleted = 0 "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (user_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_context(self, conversation_id: str, context: ConversationContext) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO contexts (conversation_id, summary, summarized_seq, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET summary = excluded.summary, "
+                "summarized_seq = excluded.summarized_seq, updated_at = excluded.updated_at "
+                "WHERE excluded.summarized_seq > contexts.summarized_seq",
+                (conversation_id, context.summary, context.summarized_seq, time.time()),
+            )
+
+    def load_context(self, conversation_id: str) -> ConversationContext | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, summarized_seq FROM contexts LEFT JOIN conversations USING (conversation_id) "
+                "WHERE conversation_id = ? AND COALESCE(deleted, 0) = 0",
+                (conversation_id,),
+            ).fetchone()
+        return ConversationContext(summary=row[0], summarized_seq=row[1]) if row else None
+
+    def delete(self, conversation_id: str) -> None:
+        # a tombstone row also covers a conversation whose messages are still queued for writing
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO conversations (conversation_id, user_id, started_at, updated_at, deleted) "
+                "VALUES (?, '', ?, ?, 1) ON CONFLICT (conversation_id) DO UPDATE SET deleted = 1",
+                (conversation_id, time.time(), time.time()),
+            )
+
+    def compact(self, retention_days: float | None = None) -> int:
+        cutoff = time.time() - retention_days * 86400 if retention_days is not None else -1
+        with self._lock:
+            with self._conn:
+                removed = [row[0] for row in self._conn.execute(
+                    "SELECT conversation_id FROM conversations WHERE deleted = 1 OR updated_at < ?", (cutoff,)
+                )]
+                self._conn.executemany("DELETE FROM messages WHERE conversation_id = ?", [(c,) for c in removed])
+                self._conn.executemany("DELETE FROM contexts WHERE conversation_id = ?", [(c,) for c in removed])
+                self._conn.executemany("DELETE FROM conversations WHERE conversation_id = ?", [(c,) for c in removed])
+            self._conn.execute("VACUUM")
+        return len(removed)
+
+
+class AppendLogConversationStore(ConversationStore):
+    """JSONL log of message, context and delete records with an in-memory offset index.
+
+    Several processes may share the log, e.g. the app and ``make compact-history``.
+    Writers hold an exclusive ``flock`` on a sidecar lock file and readers a shared
+    one, and every call first indexes the records appended since its last call.
+    ``compact`` swaps in a new file, which the other processes notice by its inode
+    and reindex from scratch. Nothing is read until the first query. A torn last
+    line from a crash is truncated by the next writer.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock_path = self.path.with_suffix(self.path.suffix + ".lock")
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self, inode: int | None = None) -> None:
+        self._inode = inode
+        self._size = 0
+        self._offsets: dict[str, list[tuple[int, int]]] = {}
+        self._owners: dict[str, str] = {}
+        self._updated: dict[str, float] = {}
+        self._deleted: set[str] = set()
+        self._message_ids: set[str] = set()
+        self._contexts: dict[str, ConversationContext] = {}
+
+    @contextmanager
+    def _file_lock(self, operation: int):
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """Index the records appended since the last call. Caller holds the file lock."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._reset()
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._size:
+            self._reset(stat.st_ino)
+        if stat.st_size == self._size:
+            return
+        with open(self.path, "rb") as file:
+            file.seek(self._size)
+            for line in iter(file.readline, b""):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    self._track(json.loads(line), self._size)
+                except json.JSONDecodeError:
+                    _logger.warning("Skipping torn record at byte %d of %s", self._size, self.path)
+                self._size += len(line)
+
+    def _track(self, record: dict, offset: int) -> None:
+        conversation_id = record["conversation_id"]
+        if record.get("type") == "delete":
+            self._deleted.add(conversation_id)
+            return
+        if record.get("type") == "context":
+            stored = self._contexts.get(conversation_id)
+            if stored is None or record["summarized_seq"] > stored.summarized_seq:
+                self._contexts[conversation_id] = ConversationContext(
+                    summary=record["summary"], summarized_seq=record["summarized_seq"]
+                )
+            return
+        self._offsets.setdefault(conversation_id, []).append((record["seq"], offset))
+        self._message_ids.add(record.get("message_id"))
+        self._owners[conversation_id] = record["user_id"]
+        self._updated[conversation_id] = max(self._updated.get(conversation_id, 0.0), record["created_at"])
+
+    def _append(self, records: list[dict]) -> None:
+        """Caller holds the exclusive file lock and has synced."""
+        with open(self.path, "ab") as file:
+            # drop a torn last line from a crashed writer
+            file.truncate(self._size)
+            self._inode = os.fstat(file.fileno()).st_ino
+            for record in records:
+                line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+                file.write(line)
+                self._track(record, self._size)
+                self._size += len(line)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def write_batch(self, messages: list[ChatMessage]) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._sync()
+            next_seq: dict[str, int] = {}
+            records, batch_ids = [], set()
+            for m in messages:
+                if m.message_id in self._message_ids or m.message_id in batch_ids:
+                    continue
+                batch_ids.add(m.message_id)
+                seq = next_seq.get(m.conversation_id)
+                if seq is None:
+                    seq = max((seq for seq, _ in self._offsets.get(m.conversation_id, [])), default=-1) + 1
+                next_seq[m.conversation_id] = seq + 1
+                records.append({"type": "message", **m.model_dump(), "seq": seq})
+            if records:
+                self._append(records)
+
+    def load_page(self, conversation_id: str, before_seq: int | None = None, limit: int = 20) -> list[ChatMessage]:
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._sync()
+            if conversation_id in self._deleted:
+                return []
+            entries = {seq: offset for seq, offset in self._offsets.get(conversation_id, [])}
+            seqs = sorted(seq for seq in entries if before_seq is None or seq < before_seq)[-limit:]
+            if not seqs:
+                return []
+            messages = []
+            with open(self.path, "rb") as file:
+                for seq in seqs:
+                    file.seek(entries[seq])
+                    record = json.loads(file.readline())
+                    record.pop("type")
+                    messages.append(ChatMessage(**record))
+        return messages
+
+    def latest_conversation(self, user_id: str) -> str | None:
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._sync()
+            owned = [c for c, owner in self._owners.items() if owner == user_id and c not in self._deleted]
+            return max(owned, key=self._updated.__getitem__, default=None)
+
+    def save_context(self, conversation_id: str, context: ConversationContext) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._sync()
+            stored = self._contexts.get(conversation_id)
+            if stored is None or context.summarized_seq > stored.summarized_seq:
+                self._append([{"type": "context", "conversation_id": conversation_id, **context.model_dump()}])
+
+    def load_context(self, conversation_id: str) -> ConversationContext | None:
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            self._sync()
+            return self._contexts.get(conversation_id) if conversation_id not in self._deleted else None
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._sync()
+            self._append([{"type": "delete", "conversation_id": conversation_id}])
+
+    def compact(self, retention_days: float | None = None) -> int:
+        cutoff = time.time() - retention_days * 86400 if retention_days is not None else -1
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            self._sync()
+            if not self.path.exists():
+                return 0
+            removed = {c for c in self._offsets if c in self._deleted or self._updated[c] < cutoff}
+            kept = {c: dict(entries) for c, entries in self._offsets.items() if c not in removed}
+            tmp_path = self.path.with_suffix(self.path.suffix + ".compacting")
+            with open(self.path, "rb") as source, open(tmp_path, "wb") as target:
+                for conversation_id, entries in kept.items():
+                    for seq in sorted(entries):
+                        source.seek(entries[seq])
+                        target.write(source.readline())
+                    if context := self._contexts.get(conversation_id):
+                        record = {"type": "context", "conversation_id": conversation_id, **context.model_dump()}
+                        target.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                target.flush()
+                os.fsync(target.fileno())
+            os.replace(tmp_path, self.path)
+            self._reset()
+            self._sync()
+        return len(removed)
+
+
+class BufferedConversationWriter:
+    """Writes queued messages in batches from a background thread.
+
+    A failed batch stays queued and is retried on the next cycle.
+    """
+
+    def __init__(self, store: ConversationStore, batch_size: int = 32, flush_interval: float = 0.5) -> None:
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failures = 0
+        self._pending: list[ChatMessage] = []
+        self._in_flight: list[ChatMessage] = []
+        self._flush_requested = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="chat-history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, message: ChatMessage) -> None:
+        with self._condition:
+            self._pending.append(message)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+
+    def discard(self, conversation_id: str) -> None:
+        """Drop the queued messages of a conversation. A batch already being written still lands."""
+        with self._condition:
+            self._pending = [m for m in self._pending if m.conversation_id != conversation_id]
+            self._condition.notify_all()
+
+    def pending(self, conversation_id: str) -> list[ChatMessage]:
+        with self._condition:
+            return [m for m in self._in_flight + self._pending if m.conversation_id == conversation_id]
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or self._flush_requested or len(self._pending) >= self.batch_size,
+                    timeout=self.flush_interval,
+                )
+                if not self._pending:
+                    self._flush_requested = False
+                    self._condition.notify_all()
+                    if self._closed:
+                        return
+                    continue
+                self._in_flight, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                batch = self._in_flight
+            try:
+                self.store.write_batch(batch)
+            except Exception:
+                self.failures += 1
+                _logger.exception("Failed to write %d chat messages", len(batch))
+                with self._condition:
+                    self._in_flight = []
+                    if self._closed:
+                        return
+                    self._pending[:0] = batch
+                    self._flush_requested = False
+                    self._condition.notify_all()
+                continue
+            with self._condition:
+                self._in_flight = []
+                self.written += len(batch)
+                self._condition.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def close(self) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+
+class ConversationHistory:
+    """Store plus write buffer. Reads see messages that are still queued.
+
+    Context folds run on a small thread pool, each one starting from the stored context.
+    """
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        batch_size: int = 32,
+        flush_interval: float = 0.5,
+        max_fold_workers: int = 2,
+    ) -> None:
+        self.store = store
+        self.writer = BufferedConversationWriter(store, batch_size, flush_interval)
+        self._folds = ThreadPoolExecutor(max_workers=max_fold_workers, thread_name_prefix="context-fold")
+
+    def append(self, message: ChatMessage) -> None:
+        self.writer.append(message)
+
+    def page(self, conversation_id: str, before_seq: int | None = None, limit: int = 20) -> list[ChatMessage]:
+        # queued messages are newer than anything stored, so they only belong on the latest page
+        pending = self.writer.pending(conversation_id) if before_seq is None else []
+        stored = self.store.load_page(conversation_id, before_seq, limit)
+        stored_ids = {m.message_id for m in stored}
+        return (stored + [m for m in pending if m.message_id not in stored_ids])[-limit:]
+
+    def latest_conversation(self, user_id: str) -> str | None:
+        return self.store.latest_conversation(user_id)
+
+    def context(self, conversation_id: str) -> ConversationContext:
+        return self.store.load_context(conversation_id) or ConversationContext()
+
+    def fold_context(
+        self, conversation_id: str, fold: Callable[[ConversationContext], ConversationContext]
+    ) -> Future:
+        """Apply ``fold`` to the stored context in the background and store the result."""
+        def run() -> ConversationContext:
+            context = self.context(conversation_id)
+            folded = fold(context)
+            if folded.summarized_seq > context.summarized_seq:
+                self.store.save_context(conversation_id, folded)
+            return folded
+
+        future = self._folds.submit(run)
+        future.add_done_callback(_log_failed_fold)
+        return future
+
+    def delete(self, conversation_id: str) -> None:
+        self.writer.discard(conversation_id)
+        self.store.delete(conversation_id)
+
+
+def _log_failed_fold(future: Future) -> None:
+    if future.exception() is not None:
+        _logger.error("Failed to fold the conversation context", exc_info=future.exception())
+
+
+def build_conversation_store(path: str | Path = CHAT_HISTORY_PATH) -> ConversationStore:
+    if Path(path).suffix == ".jsonl":
+        return AppendLogConversationStore(path)
+    return SQLiteConversationStore(path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compact the chat history store")
+    parser.add_argument("--path", default=os.environ.get(CHAT_HISTORY_ENV, str(CHAT_HISTORY_PATH)))
+    parser.add_argument("--retention-days", type=float, default=None)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    removed = build_conversation_store(args.path).compact(args.retention_days)
+    _logger.info("Removed %d conversations from %s", removed, args.path)
+
+
+if __name__ == "__main__":
+    main()
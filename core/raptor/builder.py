@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from langchain.chat_models.base import BaseChatModel
+from langchain.embeddings.base import Embeddings
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel, Field
+
+from core.constants import RAPTOR_CORPUS
+from core.raptor.clustering import perform_clustering
+from core.tokens import truncate_tokens
+from core.vectorstores.corpus import CorpusChunk, iter_corpus, write_corpus
+from core.vectorstores.ingestion import chunk_id
+
+_logger = logging.getLogger(__name__)
+
+
+SUMMARY_PROMPT: ChatPromptTemplate = ChatPromptTemplate.from_template("""
+Write a summary of the following, including as many key details as possible.
+Max words: 150.
+Documentation:
+{context}
+""")
+
+CLUSTER_SEPARATOR = "--- --- \n --- --- "
+
+
+class RaptorNode(BaseModel):
+    id: str
+    text: str
+    level: int
+    cluster: int | None = None
+    children: list[str] = Field(default_factory=list)
+    metadata: dict = Field(default_factory=dict)
+
+    def to_chunk(self) -> CorpusChunk:
+        metadata = {**self.metadata, "id": self.id, "level": self.level}
+        if self.cluster is not None:
+            metadata["cluster"] = self.cluster
+        if self.children:
+            metadata["children"] = self.children
+        return self.text, metadata
+
+    @classmethod
+    def from_chunk(cls, text: str, metadata: dict) -> "RaptorNode":
+        metadata = dict(metadata)
+        return cls(
+            id=metadata.pop("id", None) or chunk_id(text),
+            text=text,
+            level=metadata.pop("level", 0),
+            cluster=metadata.pop("cluster", None),
+            children=metadata.pop("children", []),
+            metadata=metadata,
+        )
+
+
+class TreeState(BaseModel):
+    """Bookkeeping saved next to the tree to know when incremental updates drifted too far."""
+    leaves_at_build: int = 0
+    changed_since_build: int = 0
+
+    @classmethod
+    def load(cls, path: Path) -> "TreeState":
+        return cls.model_validate_json(path.read_text()) if path.exists() else cls()
+
+    def save(self, path: Path) -> None:
+        path.write_text(self.model_dump_json())
+
+
+def state_path(tree_path: str | Path) -> Path:
+    tree_path = Path(tree_path)
+    return tree_path.with_name(tree_path.name + ".state.json")
+
+
+def build_summary_chain(llm: BaseChatModel) -> Runnable:
+    return SUMMARY_PROMPT | llm | StrOutputParser()
+
+
+class RaptorTreeBuilder:
+    """Builds RAPTOR levels: cluster the current level, summarize every cluster, repeat.
+
+    Summaries of one level run concurrently, bounded by ``max_concurrency`` and a
+    shared ``requests_per_second`` limiter. Each summary is embedded as soon as it is
+    written, so the next level's inputs are ready when the last summary lands.
+    """
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        embeddings: Embeddings,
+        n_levels: int = 3,
+        dim: int = 10,
+        threshold: float = 0.1,
+        max_concurrency: int = 8,
+        requests_per_second: float = 2.0,
+        max_context_tokens: int = 12_000,
+    ) -> None:
+        self.summary_chain = build_summary_chain(llm)
+        self.embeddings = embeddings
+        self.n_levels = n_levels
+        self.dim = dim
+        self.threshold = threshold
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = InMemoryRateLimiter(
+            requests_per_second=requests_per_second,
+            max_bucket_size=max(1, int(requests_per_second)),
+        )
+        self.max_context_tokens = max_context_tokens
+
+    def format_cluster(self, nodes: list[RaptorNode]) -> str:
+        return truncate_tokens(CLUSTER_SEPARATOR.join(node.text for node in nodes), self.max_context_tokens)
+
+    async def summarize_cluster(
+        self, semaphore: asyncio.Semaphore, level: int, cluster: int, nodes: list[RaptorNode]
+    ) -> tuple[RaptorNode, list[float]]:
+        async with semaphore:
+            await self.rate_limiter.aacquire()
+            summary = await self.summary_chain.ainvoke({"context": self.format_cluster(nodes)})
+        vector = (await self.embeddings.aembed_documents([summary]))[0]
+        node = RaptorNode(
+            id=chunk_id(summary),
+            text=summary,
+            level=level,
+            cluster=cluster,
+            children=[child.id for child in nodes],
+        )
+        return node, vector
+
+    def cluster(self, vectors: np.ndarray) -> dict[int, list[int]]:
+        members = defaultdict(list)
+        for idx, labels in enumerate(perform_clustering(vectors, self.dim, self.threshold)):
+            for label in labels:
+                members[int(label)].append(idx)
+        return dict(sorted(members.items()))
+
+    async def build_level(
+        self, level: int, nodes: list[RaptorNode], vectors: np.ndarray
+    ) -> tuple[list[RaptorNode], np.ndarray]:
+        members = self.cluster(vectors)
+        _logger.info("Level %d: %d nodes in %d clusters", level, len(nodes), len(members))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        summarized = await asyncio.gather(*(
+            self.summarize_cluster(semaphore, level, cluster, [nodes[idx] for idx in indices])
+            for cluster, indices in members.items()
+        ))
+        return [node for node, _ in summarized], np.asarray([vector for _, vector in summarized])
+
+    async def abuild(self, leaves: list[RaptorNode]) -> list[RaptorNode]:
+        tree = list(leaves)
+        nodes = leaves
+        vectors = np.asarray(await self.embeddings.aembed_documents([node.text for node in leaves]))
+        for level in range(1, self.n_levels + 1):
+            if len(nodes) <= 1:
+                break
+            nodes, vectors = await self.build_level(level, nodes, vectors)
+            tree.extend(nodes)
+            if len(nodes) == 1:
+                break
+        return tree
+
+    def build(self, leaves: list[RaptorNode]) -> list[RaptorNode]:
+        return asyncio.run(self.abuild(leaves))
+
+
+def load_leaves(corpus_path: str | Path) -> list[RaptorNode]:
+    # leaf ids are content hashes, a stored "id" would hide an edited text from the updater
+    return [
+        RaptorNode.from_chunk(text, {**metadata, "id": chunk_id(text)})
+        for text, metadata in iter_corpus(corpus_path, max_level=0)
+    ]
+
+
+def save_tree(path: str | Path, tree: Iterable[RaptorNode]) -> int:
+    return write_corpus(path, (node.to_chunk() for node in tree))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the RAPTOR tree over the leaf chunks of a corpus")
+    parser.add_argument("--input", default=str(RAPTOR_CORPUS), help="JSONL corpus, only level 0 chunks are used")
+    parser.add_argument("--output", default=str(RAPTOR_CORPUS))
+    parser.add_argument("--levels", type=int, default=3)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-second", type=float, default=2.0)
+    parser.add_argument("--llm", choices=["gemini", "openai"], default="gemini")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from core.embdeddings import get_embeddings
+    from core.llms import get_gemini_llm, get_openai_llm
+
+    llm = get_gemini_llm() if args.llm == "gemini" else get_openai_llm()
+    builder = RaptorTreeBuilder(
+        llm,
+        get_embeddings(),
+        n_levels=args.levels,
+        max_concurrency=args.max_concurrency,
+        requests_per_second=args.requests_per_second,
+    )
+    leaves = load_leaves(args.input)
+    tree = builder.build(leaves)
+    _logger.info("Wrote %d nodes to %s", save_tree(args.output, tree), args.output)
+    TreeState(leaves_at_build=len(leaves)).save(state_path(args.output))
+
+
+if __name__ == "__main__":
+    main()
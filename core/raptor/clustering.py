@@ -0,0 +1,163 @@
+"""Vectorized NumPy port of the RAPTOR clustering from ``research/RAPTOR_demo.ipynb``.
+
+The notebook reduced embeddings with UMAP and clustered them with scikit-learn's
+GaussianMixture. Here dimensionality reduction is a PCA over normalized embeddings
+and the mixture is a full covariance EM written with NumPy matrix operations, so
+neither umap-learn nor scikit-learn is needed and a whole level clusters in seconds.
+"""
+import numpy as np
+from pydantic import BaseModel, ConfigDict
+
+RANDOM_SEED = 523
+
+
+class GaussianMixtureFit(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    weights: np.ndarray
+    means: np.ndarray
+    covariances: np.ndarray
+    log_likelihood: float
+
+    @property
+    def n_parameters(self) -> int:
+        n_components, dim = self.means.shape
+        return n_components * dim + n_components * dim * (dim + 1) // 2 + n_components - 1
+
+    def bic(self, n_samples: int) -> float:
+        return -2 * self.log_likelihood + self.n_parameters * np.log(n_samples)
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        log_prob = _log_gaussian(embeddings, self.means, self.covariances) + np.log(self.weights)
+        return np.exp(log_prob - _logsumexp(log_prob)[:, None])
+
+
+def _logsumexp(values: np.ndarray) -> np.ndarray:
+    peak = values.max(axis=1)
+    return peak + np.log(np.exp(values - peak[:, None]).sum(axis=1))
+
+
+def _log_gaussian(embeddings: np.ndarray, means: np.ndarray, covariances: np.ndarray) -> np.ndarray:
+    n_samples, dim = embeddings.shape
+    cholesky = np.linalg.cholesky(covariances)
+    log_det = 2 * np.log(np.diagonal(cholesky, axis1=1, axis2=2)).sum(axis=1)
+    log_prob = np.empty((n_samples, len(means)))
+    for component, (mean, lower) in enumerate(zip(means, cholesky)):
+        whitened = np.linalg.solve(lower, (embeddings - mean).T)
+        log_prob[:, component] = (whitened ** 2).sum(axis=0)
+    return -0.5 * (dim * np.log(2 * np.pi) + log_det + log_prob)
+
+
+def _kmeans(embeddings: np.ndarray, n_clusters: int, rng: np.random.Generator, n_iter: int = 10) -> np.ndarray:
+    # k-means++ seeding followed by a few Lloyd steps, used to initialize the mixture
+    centers = embeddings[[rng.integers(len(embeddings))]]
+    for _ in range(1, n_clusters):
+        distances = ((embeddings[:, None, :] - centers[None]) ** 2).sum(-1).min(axis=1)
+        probs = distances / distances.sum() if distances.sum() > 0 else None
+        centers = np.vstack([centers, embeddings[rng.choice(len(embeddings), p=probs)]])
+    for _ in range(n_iter):
+        labels = ((embeddings[:, None, :] - centers[None]) ** 2).sum(-1).argmin(axis=1)
+        one_hot = np.eye(n_clusters)[labels]
+        counts = one_hot.sum(axis=0)
+        centers = np.where(counts[:, None] > 0, one_hot.T @ embeddings / np.maximum(counts, 1)[:, None], centers)
+    return np.eye(n_clusters)[((embeddings[:, None, :] - centers[None]) ** 2).sum(-1).argmin(axis=1)]
+
+
+def _m_step(embeddings: np.ndarray, responsibilities: np.ndarray, reg_covar: float):
+    counts = responsibilities.sum(axis=0) + 10 * np.finfo(float).eps
+    weights = counts / len(embeddings)
+    means = responsibilities.T @ embeddings / counts[:, None]
+    covariances = np.empty((len(means), embeddings.shape[1], embeddings.shape[1]))
+    for component, mean in enumerate(means):
+        centered = embeddings - mean
+        covariances[component] = (responsibilities[:, component, None] * centered).T @ centered / counts[component]
+        covariances[component].flat[::embeddings.shape[1] + 1] += reg_covar
+    return weights, means, covariances
+
+
+def fit_gaussian_mixture(
+    embeddings: np.ndarray,
+    n_components: int,
+    max_iter: int = 100,
+    tol: float = 1e-3,
+    reg_covar: float = 1e-6,
+    random_state: int = RANDOM_SEED,
+) -> GaussianMixtureFit:
+    """Full covariance EM, initialized with k-means like scikit-learn's GaussianMixture."""
+    responsibilities = _kmeans(embeddings, n_components, np.random.default_rng(random_state))
+
+    previous = -np.inf
+    for _ in range(max_iter):
+        weights, means, covariances = _m_step(embeddings, responsibilities, reg_covar)
+        log_prob = _log_gaussian(embeddings, means, covariances) + np.log(weights)
+        log_norm = _logsumexp(log_prob)
+        responsibilities = np.exp(log_prob - log_norm[:, None])
+
+        current = log_norm.mean()
+        if abs(current - previous) < tol:
+            break
+        previous = current
+
+    weights, means, covariances = _m_step(embeddings, responsibilities, reg_covar)
+    log_likelihood = _logsumexp(_log_gaussian(embeddings, means, covariances) + np.log(weights)).sum()
+    return GaussianMixtureFit(
+        weights=weights, means=means, covariances=covariances, log_likelihood=float(log_likelihood)
+    )
+
+
+def reduce_dimensions(embeddings: np.ndarray, dim: int) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.where(norms == 0, 1, norms)
+    centered = normalized - normalized.mean(axis=0)
+    _, _, components = np.linalg.svd(centered, full_matrices=False)
+    return centered @ components[:dim].T
+
+
+def get_optimal_clusters(
+    embeddings: np.ndarray, max_clusters: int = 50, random_state: int = RANDOM_SEED
+) -> tuple[int, GaussianMixtureFit]:
+    max_clusters = min(max_clusters, len(embeddings))
+    fits = [
+        fit_gaussian_mixture(embeddings, n, random_state=random_state)
+        for n in range(1, max(max_clusters, 2))
+    ]
+    best = int(np.argmin([fit.bic(len(embeddings)) for fit in fits]))
+    return best + 1, fits[best]
+
+
+def gmm_cluster(embeddings: np.ndarray, threshold: float) -> tuple[list[np.ndarray], int]:
+    n_clusters, fit = get_optimal_clusters(embeddings)
+    probs = fit.predict_proba(embeddings)
+    labels = [
+        np.where(prob > threshold)[0] if prob.max() > threshold else np.array([prob.argmax()])
+        for prob in probs
+    ]
+    return labels, n_clusters
+
+
+def perform_clustering(embeddings: np.ndarray, dim: int, threshold: float) -> list[np.ndarray]:
+    """Global then local soft clustering, returns the cluster ids of every embedding."""
+    if len(embeddings) <= dim + 1:
+        return [np.array([0]) for _ in range(len(embeddings))]
+
+    global_clusters, n_global_clusters = gmm_cluster(reduce_dimensions(embeddings, dim), threshold)
+    global_members = [
+        np.array([idx for idx, labels in enumerate(global_clusters) if cluster in labels], dtype=int)
+        for cluster in range(n_global_clusters)
+    ]
+
+    all_local_clusters: list[list[int]] = [[] for _ in range(len(embeddings))]
+    total_clusters = 0
+    for members in global_members:
+        if len(members) == 0:
+            continue
+        if len(members) <= dim + 1:
+            local_clusters, n_local_clusters = [np.array([0]) for _ in members], 1
+        else:
+            local_clusters, n_local_clusters = gmm_cluster(reduce_dimensions(embeddings[members], dim), threshold)
+
+        for idx, labels in zip(members, local_clusters):
+            all_local_clusters[idx].extend(int(label) + total_clusters for label in labels)
+        total_clusters += n_local_clusters
+
+    return [np.array(sorted(set(labels)), dtype=int) for labels in all_local_clusters]
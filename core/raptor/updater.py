@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+
+import numpy as np
+from pydantic import BaseModel
+
+from core.constants import RAPTOR_CORPUS
+from core.raptor.builder import RaptorNode, RaptorTreeBuilder, TreeState, load_leaves, save_tree, state_path
+from core.vectorstores.corpus import iter_corpus
+
+_logger = logging.getLogger(__name__)
+
+
+class UpdateReport(BaseModel):
+    added: int = 0
+    removed: int = 0
+    outliers: int = 0
+    resummarized: int = 0
+    full_rebuild: bool = False
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class RaptorTreeUpdater:
+    """Applies leaf changes to an existing RAPTOR tree without rebuilding it.
+
+    New leaves join the level 1 cluster with the closest centroid, removed leaves
+    leave theirs, and only the summaries on the path from a touched cluster to the
+    root are regenerated. When the leaves changed since the last full build (or the
+    new leaves that fit no cluster well) exceed ``drift_threshold`` of the corpus,
+    the whole tree is rebuilt instead.
+    """
+
+    def __init__(
+        self,
+        builder: RaptorTreeBuilder,
+        drift_threshold: float = 0.2,
+        outlier_similarity: float = 0.5,
+    ) -> None:
+        self.builder = builder
+        self.embeddings = builder.embeddings
+        self.drift_threshold = drift_threshold
+        self.outlier_similarity = outlier_similarity
+
+    async def _assign(
+        self, summaries: list[RaptorNode], nodes: dict[str, RaptorNode], added: list[RaptorNode]
+    ) -> tuple[dict[str, list[str]], int]:
+        # a summary whose children are all gone has no centroid to join
+        summaries = [summary for summary in summaries if any(child in nodes for child in summary.children)]
+        if not summaries:
+            return {}, len(added)
+        texts = [nodes[child].text for summary in summaries for child in summary.children if child in nodes]
+        vectors = iter(await self.embeddings.aembed_documents(texts))
+        centroids = []
+        for summary in summaries:
+            members = [next(vectors) for child in summary.children if child in nodes]
+            centroids.append(np.mean(members, axis=0))
+        centroids = _normalize(np.asarray(centroids))
+
+        added_vectors = _normalize(np.asarray(await self.embeddings.aembed_documents([leaf.text for leaf in added])))
+        similarities = added_vectors @ centroids.T
+        nearest = similarities.argmax(axis=1)
+
+        assigned = defaultdict(list)
+        for leaf, idx in zip(added, nearest):
+            assigned[summaries[idx].id].append(leaf.id)
+        outliers = int((similarities.max(axis=1) < self.outlier_similarity).sum())
+        return assigned, outliers
+
+    async def aupdate(
+        self, tree: list[RaptorNode], leaves: list[RaptorNode], state: TreeState
+    ) -> tuple[list[RaptorNode], TreeState, UpdateReport]:
+        nodes = {node.id: node for node in tree}
+        old_leaf_ids = {node.id for node in tree if node.level == 0}
+        new_leaf_ids = {leaf.id for leaf in leaves}
+        added = [leaf for leaf in leaves if leaf.id not in old_leaf_ids]
+        removed = old_leaf_ids - new_leaf_ids
+        report = UpdateReport(added=len(added), removed=len(removed))
+        if not added and not removed:
+            return tree, state, report
+
+        summaries = [node for node in tree if node.level == 1]
+        changed = state.changed_since_build + len(added) + len(removed)
+        if summaries and added:
+            assigned, report.outliers = await self._assign(summaries, nodes, added)
+        else:
+            assigned = {}
+        drift = (changed + report.outliers) / max(state.leaves_at_build or len(old_leaf_ids), 1)
+        if not summaries or drift > self.drift_threshold:
+            _logger.info("Drift %.2f above %.2f, rebuilding the whole tree", drift, self.drift_threshold)
+            report.full_rebuild = True
+            tree = await self.builder.abuild(leaves)
+            return tree, TreeState(leaves_at_build=len(leaves)), report
+
+        for leaf in added:
+            nodes[leaf.id] = leaf
+        parents = defaultdict(list)
+        for node in tree:
+            for child in node.children:
+                parents[child].append(node.id)
+
+        # old id -> new id for regenerated summaries, None for dropped nodes
+        replaced: dict[str, str | None] = {leaf_id: None for leaf_id in removed}
+        dirty = {parent for leaf_id in removed for parent in parents[leaf_id]} | set(assigned)
+        semaphore = asyncio.Semaphore(self.builder.max_concurrency)
+        while dirty:
+            level = min(nodes[node_id].level for node_id in dirty)
+            current = [node_id for node_id in dirty if nodes[node_id].level == level]
+            dirty.difference_update(current)
+
+            jobs = []
+            for node_id in current:
+                node = nodes[node_id]
+                children = [replaced.get(child, child) for child in node.children] + assigned.get(node_id, [])
+                children = [child for child in dict.fromkeys(children) if child is not None]
+                if not children:
+                    replaced[node_id] = None
+                    dirty.update(parents[node_id])
+                    continue
+                jobs.append((node, self.builder.summarize_cluster(
+                    semaphore, level, node.cluster, [nodes[child] for child in children]
+                )))
+
+            for (node, _), (new_node, _) in zip(jobs, await asyncio.gather(*(job for _, job in jobs))):
+                replaced[node.id] = new_node.id
+                nodes[new_node.id] = new_node
+                report.resummarized += 1
+                dirty.update(parents[node.id])
+
+        kept = [node for node in tree if node.id not in replaced]
+        kept.extend(added)
+        kept.extend(nodes[new_id] for new_id in replaced.values() if new_id is not None)
+        kept.sort(key=lambda node: node.level)
+        return kept, TreeState(leaves_at_build=state.leaves_at_build, changed_since_build=changed), report
+
+    def update(
+        self, tree: list[RaptorNode], leaves: list[RaptorNode], state: TreeState
+    ) -> tuple[list[RaptorNode], TreeState, UpdateReport]:
+        return asyncio.run(self.aupdate(tree, leaves, state))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Apply changed leaf chunks to an existing RAPTOR tree")
+    parser.add_argument("--tree", default=str(RAPTOR_CORPUS), help="JSONL corpus written by core.raptor.builder")
+    parser.add_argument("--leaves", required=True, help="JSONL corpus with the current level 0 chunks")
+    parser.add_argument("--output", default=None, help="defaults to overwriting --tree")
+    parser.add_argument("--drift-threshold", type=float, default=0.2)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-second", type=float, default=2.0)
+    parser.add_argument("--llm", choices=["gemini", "openai"], default="gemini")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from core.embdeddings import get_embeddings
+    from core.llms import get_gemini_llm, get_openai_llm
+
+    llm = get_gemini_llm() if args.llm == "gemini" else get_openai_llm()
+    builder = RaptorTreeBuilder(
+        llm, get_embeddings(), max_concurrency=args.max_concurrency, requests_per_second=args.requests_per_second
+    )
+    updater = RaptorTreeUpdater(builder, drift_threshold=args.drift_threshold)
+    tree = [RaptorNode.from_chunk(text, metadata) for text, metadata in iter_corpus(args.tree)]
+    output = args.output or args.tree
+    tree, state, report = updater.update(tree, load_leaves(args.leaves), TreeState.load(state_path(args.tree)))
+    save_tree(output, tree)
+    state.save(state_path(output))
+    _logger.info("Updated tree written to %s: %s", output, report.model_dump())
+
+
+if __name__ == "__main__":
+    main()
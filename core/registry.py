@@ -0,0 +1,141 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Literal
+
+from pydantic import BaseModel
+
+_logger = logging.getLogger(__name__)
+
+ResourceFactory = Callable[["ResourceRegistry"], Any]
+
+
+class ResourceHealth(BaseModel):
+    status: Literal["pending", "building", "ready", "failed"] = "pending"
+    build_seconds: float | None = None
+    error: str | None = None
+
+
+class ResourceRegistry:
+    """Process-wide, lazily built shared resources (LLM clients, Chroma, chains).
+
+    Each resource is built at most once, on first ``get`` or during ``warm_up``.
+    Factories receive the registry, so a chain can ask for the LLM it needs.
+    """
+
+    def __init__(self) -> None:
+        self._factories: dict[str, ResourceFactory] = {}
+        self._instances: dict[str, Any] = {}
+        self._health: dict[str, ResourceHealth] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread: threading.Thread | None = None
+
+    def register(self, name: str, factory: ResourceFactory) -> None:
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+            self._health[name] = ResourceHealth()
+
+    def get(self, name: str) -> Any:
+        if name in self._instances:
+            return self._instances[name]
+        with self._locks[name]:
+            if name not in self._instances:
+                health = self._health[name]
+                health.status = "building"
+                started = time.perf_counter()
+                try:
+                    self._instances[name] = self._factories[name](self)
+                except Exception as error:
+                    health.status, health.error = "failed", repr(error)
+                    _logger.exception("Failed to build resource %s", name)
+                    raise
+                health.status, health.error = "ready", None
+                health.build_seconds = time.perf_counter() - started
+                _logger.info("Built resource %s in %.2fs", name, health.build_seconds)
+        return self._instances[name]
+
+    def warm_up(self, background: bool = False) -> None:
+        if background:
+            with self._lock:
+                if self._warm_up_thread is None:
+                    self._warm_up_thread = threading.Thread(target=self.warm_up, name="warm-up", daemon=True)
+                    self._warm_up_thread.start()
+            return
+        for name in list(self._factories):
+            try:
+                self.get(name)
+            except Exception:
+                continue
+
+    def health(self) -> dict[str, ResourceHealth]:
+        return {name: health.model_copy() for name, health in self._health.items()}
+
+    @property
+    def ready(self) -> bool:
+        return all(health.status == "ready" for health in self._health.values())
+
+
+def build_resource_registry() -> ResourceRegistry:
+    from core.caches.memo import QuestionMemo
+    from core.caches.semantic import SemanticCache
+    from core.chains.conversation import build_context_manager
+    from core.chains.google_search import build_google_search_retriever, build_search_chain
+    from core.chains.query_evaluation import build_evaluate_question_chain, evaluation_from_labels, evaluation_labels
+    from core.classifiers.local import LocalClassifierTier
+    from core.chains.raptor import build_rag_chain
+    from core.constants import CHROMA_VECTORS, DECISIONS_LOG_PATH, SEMANTIC_CACHE_PATH
+    from core.embdeddings import get_embeddings
+    from core.llms import get_gemini_llm
+    from core.vectorstores.chroma import LEXICAL_INDEX_FILENAME, load_vector_store
+    from core.retrievers.hybrid import build_hybrid_retriever
+
+    registry = ResourceRegistry()
+    registry.register("llm", lambda r: get_gemini_llm())
+    registry.register("embeddings", lambda r: get_embeddings())
+    registry.register("vector_store", lambda r: load_vector_store(r.get("embeddings"), str(CHROMA_VECTORS)))
+    lexical_index = CHROMA_VECTORS / LEXICAL_INDEX_FILENAME
+    registry.register("retriever", lambda r: (
+        build_hybrid_retriever(r.get("vector_store"), lexical_index) if lexical_index.exists() else None
+    ))
+    registry.register("context_manager", lambda r: build_context_manager(r.get("llm")))
+    registry.register("semantic_cache", lambda r: SemanticCache(r.get("embeddings"), SEMANTIC_CACHE_PATH))
+    registry.register("local_classifier", lambda r: LocalClassifierTier(r.get("embeddings"), DECISIONS_LOG_PATH))
+    registry.register("evaluate_question_chain", lambda r: QuestionMemo().wrap(r.get("local_classifier").wrap(
+        build_evaluate_question_chain(r.get("llm")), "evaluation", evaluation_labels, evaluation_from_labels
+    )))
+    registry.register("rag_chain", lambda r: build_rag_chain(
+        r.get("llm"), r.get("vector_store"), cache=r.get("semantic_cache"), retriever=r.get("retriever")
+    ))
+    registry.register("google_chain", lambda r: build_search_chain(
+        r.get("llm"), build_google_search_retriever(), cache=r.get("semantic_cache")
+    ))
+    return registry
+
+
+@lru_cache(maxsize=None)
+def get_resource_registry() -> ResourceRegistry:
+    return build_resource_registry()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build every shared resource once and report their health")
+    parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    import dotenv
+    from core.constants import DOTENV_PATH
+    dotenv.load_dotenv(DOTENV_PATH)
+
+    registry = get_resource_registry()
+    registry.warm_up()
+    print(json.dumps({name: health.model_dump() for name, health in registry.health().items()}, indent=2))
+    raise SystemExit(0 if registry.ready else 1)
+
+
+if __name__ == "__main__":
+    main()
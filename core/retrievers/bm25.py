@@ -0,0 +1,96 @@
+import math
+import pickle
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from langchain_core.documents import Document
+
+TOKEN_PATTERN = re.compile(r"\d+(?:[/.\-:]\d+)+[a-z]?|[a-z0-9§]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the this to was were will with what which who how "
+    "does do can".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring.
+
+    Postings are kept as NumPy arrays per term, so scoring a query is a handful of
+    vectorized updates over the matched documents only.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.texts: list[str] = []
+        self.metadatas: list[dict] = []
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: dict[str, float] = {}
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[tuple[str, dict | None]], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        lengths, seen = [], set()
+        for text, metadata in chunks:
+            if text in seen:
+                continue
+            seen.add(text)
+            doc_id = len(index.texts)
+            index.texts.append(text)
+            index.metadatas.append({
+                key: value for key, value in (metadata or {}).items() if isinstance(value, (str, int, float, bool))
+            })
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+
+        index.doc_lengths = np.asarray(lengths, dtype=np.float32)
+        n_docs = len(index.texts)
+        for term, entries in postings.items():
+            doc_ids, tfs = zip(*entries)
+            index.postings[term] = (np.asarray(doc_ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            index.idf[term] = math.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def search(self, query: str, k: int = 10) -> list[tuple[Document, float]]:
+        if not self.texts:
+            return []
+        scores = np.zeros(len(self.texts), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(float(self.doc_lengths.mean()), 1.0))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_ids, tfs = self.postings[term]
+            scores[doc_ids] += self.idf[term] * tfs * (self.k1 + 1) / (tfs + norm[doc_ids])
+
+        matched = np.flatnonzero(scores)
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return [
+            (Document(page_content=self.texts[idx], metadata=self.metadatas[idx]), float(scores[idx]))
+            for idx in top
+        ]
+
+    def save(self, path: str | Path) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BM25Index":
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+        if not isinstance(index, cls):
+            raise RuntimeError(f"Bad BM25 index data in {path}")
+        return index
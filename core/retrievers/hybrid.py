@@ -0,0 +1,88 @@
+import re
+from pathlib import Path
+from typing import Final
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict
+
+from core.retrievers.bm25 import BM25Index
+from core.retrievers.raptor import RaptorRetriever, pack_documents
+
+CITATION_PATTERN: Final[re.Pattern] = re.compile(
+    r"\b\d+\s*ILCS\s*\d+"                                  # 410 ILCS 82
+    r"|\b\d+/\d+-\d+(?:[-.]\d+)*"                          # 5/12-3.05, not dates or fractions
+    r"|(?:§+|\bsec(?:tion|\.)?)\s*\d+-\d+(?:[-.]\d+)*",   # § 12-3, Section 10-5, not "section 2 of my lease"
+    re.IGNORECASE,
+)
+
+
+def is_citation_query(query: str) -> bool:
+    return CITATION_PATTERN.search(query) is not None
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], rrf_k: int = 60) -> list[tuple[Document, float]]:
+    scores: dict[str, float] = {}
+    documents: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = document.page_content
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(((documents[key], score) for key, score in scores.items()), key=lambda pair: pair[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses BM25 and dense retrieval with reciprocal rank fusion.
+
+    Queries that look like statute citations (``410 ILCS 82``, ``5/12-3``, ``§ 12-3``)
+    are answered from the lexical index alone, without a query embedding call.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_retriever: BaseRetriever
+    lexical_index: BM25Index
+    lexical_k: int = 12
+    rrf_k: int = 60
+    token_budget: int = 3000
+    citation_fast_path: bool = True
+
+    def _lexical(self, query: str) -> list[Document]:
+        return [document for document, _ in self.lexical_index.search(query, k=self.lexical_k)]
+
+    def _fuse(self, query: str, dense: list[Document] | None) -> list[Document]:
+        lexical = self._lexical(query)
+        if dense is None:
+            scored = [(document, 1.0 / (rank + 1)) for rank, document in enumerate(lexical)]
+        else:
+            scored = reciprocal_rank_fusion([lexical, dense], self.rrf_k)
+        return pack_documents(scored, self.token_budget)
+
+    def _use_fast_path(self, query: str) -> bool:
+        return self.citation_fast_path and is_citation_query(query)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        if self._use_fast_path(query):
+            return self._fuse(query, None)
+        dense = self.vector_retriever.invoke(query, {"callbacks": run_manager.get_child()})
+        return self._fuse(query, dense)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        if self._use_fast_path(query):
+            return self._fuse(query, None)
+        dense = await self.vector_retriever.ainvoke(query, {"callbacks": run_manager.get_child()})
+        return self._fuse(query, dense)
+
+
+def build_hybrid_retriever(vectorstore: VectorStore, index_path: str | Path, **kwargs) -> HybridRetriever:
+    return HybridRetriever(
+        vector_retriever=RaptorRetriever(vectorstore=vectorstore),
+        lexical_index=BM25Index.load(index_path),
+        **kwargs,
+    )
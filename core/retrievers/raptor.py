@@ -0,0 +1,96 @@
+import asyncio
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import PrivateAttr
+
+from core.tokens import count_tokens
+
+LEAF_FILTER = {"level": 0}
+SUMMARY_FILTER = {"level": {"$gt": 0}}
+
+
+def pack_documents(scored: list[tuple[Document, float]], token_budget: int) -> list[Document]:
+    """Greedily keep the best scored documents that still fit into ``token_budget``."""
+    packed, used, seen = [], 0, set()
+    for document, _ in sorted(scored, key=lambda pair: pair[1], reverse=True):
+        if document.page_content in seen:
+            continue
+        tokens = count_tokens(document.page_content)
+        if used + tokens > token_budget:
+            continue
+        packed.append(document)
+        used += tokens
+        seen.add(document.page_content)
+    return packed
+
+
+class RaptorRetriever(BaseRetriever):
+    """Collapsed-tree retrieval over a RAPTOR collection with separate leaf and summary quotas.
+
+    Leaves (``level`` 0) and summaries (``level`` > 0) are searched separately, so
+    summaries can't crowd out the statute text, and the merged hits are packed into a
+    ``token_budget`` prompt. Collections indexed without level metadata fall back to a
+    plain search of ``leaf_k + summary_k`` documents. The query is embedded once for
+    all of these searches.
+    """
+    vectorstore: VectorStore
+    leaf_k: int = 8
+    summary_k: int = 4
+    token_budget: int = 3000
+
+    _unleveled: bool = PrivateAttr(default=False)
+
+    def _search_by_vector(
+        self, vector: list[float], k: int, filter: dict | None = None
+    ) -> list[tuple[Document, float]]:
+        if k <= 0:
+            return []
+        relevance = self.vectorstore._select_relevance_score_fn()
+        return [
+            (document, relevance(distance))
+            for document, distance in self.vectorstore.similarity_search_by_vector_with_relevance_scores(
+                vector, k=k, filter=filter
+            )
+        ]
+
+    def _search_vector(self, vector: list[float]) -> list[tuple[Document, float]]:
+        if not self._unleveled:
+            scored = (
+                self._search_by_vector(vector, self.leaf_k, LEAF_FILTER)
+                + self._search_by_vector(vector, self.summary_k, SUMMARY_FILTER)
+            )
+            if scored:
+                return scored
+        scored = self._search_by_vector(vector, self.leaf_k + self.summary_k)
+        # remember a collection without level metadata so later queries skip the filtered searches
+        self._unleveled = bool(scored)
+        return scored
+
+    def _search(self, query: str) -> list[tuple[Document, float]]:
+        return self._search_vector(self.vectorstore.embeddings.embed_query(query))
+
+    async def _asearch(self, query: str) -> list[tuple[Document, float]]:
+        vector = await self.vectorstore.embeddings.aembed_query(query)
+        if not self._unleveled:
+            leaves, summaries = await asyncio.gather(
+                asyncio.to_thread(self._search_by_vector, vector, self.leaf_k, LEAF_FILTER),
+                asyncio.to_thread(self._search_by_vector, vector, self.summary_k, SUMMARY_FILTER),
+            )
+            if leaves or summaries:
+                return leaves + summaries
+        scored = await asyncio.to_thread(self._search_by_vector, vector, self.leaf_k + self.summary_k)
+        self._unleveled = bool(scored)
+        return scored
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return pack_documents(self._search(query), self.token_budget)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return pack_documents(await self._asearch(query), self.token_budget)
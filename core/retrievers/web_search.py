@@ -0,0 +1,245 @@
+"""Web search retriever with concurrent providers, a TTL cache and a fixture stand-in.
+
+All provider requests run on one background event loop that owns a pooled
+``httpx.AsyncClient``, so sync and async callers share the connection pool.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Protocol
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+
+from core.caches.memo import normalize_question
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURES = Path(__file__).parent / "fixtures" / "web_search.json"
+
+
+class SearchResult(BaseModel):
+    title: str
+    url: str
+    snippet: str
+    provider: str
+
+    def to_document(self) -> Document:
+        return Document(
+            page_content=f"{self.title}\n{self.snippet}",
+            metadata={"source": self.url, "title": self.title, "provider": self.provider},
+        )
+
+
+class SearchProvider(Protocol):
+    name: str
+
+    async def search(self, client: httpx.AsyncClient, query: str, k: int) -> list[SearchResult]:
+        ...
+
+
+class SerpApiProvider:
+    name = "serpapi"
+    url = "https://serpapi.com/search.json"
+
+    def __init__(self, api_key: str) -> None:
+        self.api_key = api_key
+
+    async def search(self, client: httpx.AsyncClient, query: str, k: int) -> list[SearchResult]:
+        response = await client.get(
+            self.url, params={"q": query, "engine": "google", "num": k, "api_key": self.api_key}
+        )
+        response.raise_for_status()
+        data = response.json()
+        results = []
+        if answer_box := data.get("answer_box"):
+            snippet = answer_box.get("answer") or answer_box.get("snippet")
+            if snippet:
+                results.append(SearchResult(
+                    title=answer_box.get("title", query), url=answer_box.get("link", ""),
+                    snippet=snippet, provider=self.name,
+                ))
+        results.extend(
+            SearchResult(title=item.get("title", ""), url=item.get("link", ""), snippet=item["snippet"], provider=self.name)
+            for item in data.get("organic_results", []) if item.get("snippet")
+        )
+        return results[:k]
+
+
+class DuckDuckGoProvider:
+    name = "duckduckgo"
+
+    async def search(self, client: httpx.AsyncClient, query: str, k: int) -> list[SearchResult]:
+        from duckduckgo_search import DDGS
+
+        # the library manages its own session, keep its blocking call off the event loop
+        items = await asyncio.to_thread(lambda: DDGS().text(query, max_results=k))
+        return [
+            SearchResult(title=item.get("title", ""), url=item.get("href", ""), snippet=item["body"], provider=self.name)
+            for item in items or [] if item.get("body")
+        ]
+
+
+class FixtureSearchProvider:
+    """Serves canned results from a JSON file ``{query: [{title, url, snippet}]}``, for tests."""
+    name = "fixture"
+
+    def __init__(self, path: str | Path = DEFAULT_FIXTURES, latency_seconds: float = 0.0) -> None:
+        with open(path, encoding="utf-8") as f:
+            self.results = {normalize_question(query): items for query, items in json.load(f).items()}
+        self.latency_seconds = latency_seconds
+
+    async def search(self, client: httpx.AsyncClient, query: str, k: int) -> list[SearchResult]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        items = self.results.get(normalize_question(query), self.results.get("*", []))
+        return [SearchResult(provider=self.name, **item) for item in items[:k]]
+
+
+class SearchResultCache:
+    """LRU of search results keyed by normalized query, entries expire after ``ttl_seconds``."""
+
+    def __init__(self, ttl_seconds: float = 60 * 60, max_size: int = 2048) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, list[SearchResult]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str) -> list[SearchResult] | None:
+        key = normalize_question(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time() - self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query: str, results: list[SearchResult]) -> None:
+        key = normalize_question(query)
+        with self._lock:
+            self._entries[key] = (time.time(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class _SearchLoop:
+    """Background event loop owning the pooled HTTP client."""
+
+    def __init__(self, timeout_seconds: float, max_connections: int) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._client: httpx.AsyncClient | None = None
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = httpx.Timeout(timeout_seconds)
+        threading.Thread(target=self._loop.run_forever, name="web-search", daemon=True).start()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+        return self._client
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+
+class WebSearchRetriever(BaseRetriever):
+    """Queries every provider at once and keeps the first answer with ``min_results`` results.
+
+    The remaining provider requests are cancelled. Results are cached by normalized query.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    providers: list
+    k: int = 6
+    min_results: int = 1
+    timeout_seconds: float = 8.0
+    max_connections: int = 20
+    cache: SearchResultCache = Field(default_factory=SearchResultCache)
+    _runner: _SearchLoop | None = PrivateAttr(default=None)
+    _runner_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _loop(self) -> _SearchLoop:
+        with self._runner_lock:
+            if self._runner is None:
+                self._runner = _SearchLoop(self.timeout_seconds, self.max_connections)
+            return self._runner
+
+    async def _fan_out(self, runner: _SearchLoop, query: str) -> list[SearchResult]:
+        tasks = {
+            asyncio.create_task(provider.search(runner.client, query, self.k)): provider.name
+            for provider in self.providers
+        }
+        fallback: list[SearchResult] = []
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=self.timeout_seconds):
+                try:
+                    results = await next_done
+                except asyncio.TimeoutError:
+                    raise
+                except Exception as error:
+                    _logger.warning("Web search provider failed: %r", error)
+                    continue
+                if len(results) >= self.min_results:
+                    return results
+                fallback = fallback or results
+        except asyncio.TimeoutError:
+            _logger.warning("Web search timed out after %.1fs for %r", self.timeout_seconds, query)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return fallback
+
+    def _search(self, query: str):
+        runner = self._loop()
+        return runner.submit(self._fan_out(runner, query))
+
+    def _documents(self, query: str, results: list[SearchResult]) -> list[Document]:
+        if results:
+            self.cache.put(query, results)
+        return [result.to_document() for result in results]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        cached = self.cache.get(query)
+        if cached is not None:
+            return [result.to_document() for result in cached]
+        return self._documents(query, self._search(query).result())
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        cached = self.cache.get(query)
+        if cached is not None:
+            return [result.to_document() for result in cached]
+        future = self._search(query)
+        try:
+            results = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        return self._documents(query, results)
+
+
+def build_web_search_retriever(fixtures: str | Path | None = None, **kwargs) -> WebSearchRetriever:
+    """SerpAPI (when ``SERPAPI_API_KEY`` is set) and DuckDuckGo, or only the fixture stand-in."""
+    if fixtures is not None:
+        return WebSearchRetriever(providers=[FixtureSearchProvider(fixtures)], **kwargs)
+    providers = [DuckDuckGoProvider()]
+    if api_key := os.environ.get("SERPAPI_API_KEY"):
+        providers.insert(0, SerpApiProvider(api_key))
+    return WebSearchRetriever(providers=providers, **kwargs)
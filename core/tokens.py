@@ -0,0 +1,21 @@
+from functools import lru_cache
+from typing import Final
+
+import tiktoken
+
+DEFAULT_ENCODING: Final[str] = "cl100k_base"
+
+
+@lru_cache
+def get_encoding(name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> str:
+    encoding = get_encoding(encoding_name)
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
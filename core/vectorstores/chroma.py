@@ -1,46 +1,74 @@
-import json
-import pickle
-from typing import Callable
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
 
-from langchain.embeddings import OpenAIEmbeddings
 from langchain.embeddings.base import Embeddings
 from langchain.vectorstores import Chroma
 from langchain.vectorstores import VectorStore
 
+from core.constants import RAPTOR_CORPUS
+from core.vectorstores.corpus import iter_corpus
+from core.vectorstores.ingestion import ingest_chunks, ingest_texts
+from core.retrievers.bm25 import BM25Index
 
-def load_texts():
-    with open('saved_raptor_result.pkl', 'rb') as f:
-        loaded_dict = pickle.load(f)
 
-    raptor = loaded_dict
+def load_texts(corpus_path: str | Path = RAPTOR_CORPUS) -> Iterator[str]:
+    for text, _ in iter_corpus(corpus_path):
+        yield text
 
-    with open('chunked_texts.json', 'r') as f:
-        chunked_texts = json.load(f)
 
-    all_texts = chunked_texts.copy()
-
-    for level in sorted(raptor.keys()):
-        summaries = raptor[level][1]["summaries"].tolist()
-        all_texts.extend(summaries)
-    return all_texts
+VectorStoreLoader = Callable[[Embeddings, str], VectorStore]
 
 
-VectorStoreLoader = Callable[[Embeddings, str], VectorStore]
+CHECKPOINT_FILENAME = "ingestion_checkpoint.log"
+LEXICAL_INDEX_FILENAME = "bm25_index.pkl"
 
 
 def create_vector_store(
     embeddings: Embeddings,
     chroma_persist_directory: str,
-    all_texts: list[str]
+    all_texts: Iterable[str],
+    metadatas: Iterable[dict] | None = None,
+    batch_size: int = 128,
+    max_concurrency: int = 4,
+) -> VectorStore:
+    vectorstore = load_vector_store(embeddings, chroma_persist_directory)
+    ingest_texts(
+        vectorstore,
+        embeddings,
+        all_texts,
+        checkpoint_path=Path(chroma_persist_directory) / CHECKPOINT_FILENAME,
+        metadatas=metadatas,
+        batch_size=batch_size,
+        max_concurrency=max_concurrency,
+    )
+    return vectorstore
+
+
+def create_vector_store_from_corpus(
+    embeddings: Embeddings,
+    chroma_persist_directory: str,
+    corpus_path: str | Path = RAPTOR_CORPUS,
+    batch_size: int = 128,
+    max_concurrency: int = 4,
 ) -> VectorStore:
-    vectorstore = Chroma.from_texts(
-        texts=all_texts,
-        embedding=embeddings,
-        persist_directory=chroma_persist_directory
+    vectorstore = load_vector_store(embeddings, chroma_persist_directory)
+    ingest_chunks(
+        vectorstore,
+        embeddings,
+        iter_corpus(corpus_path),
+        checkpoint_path=Path(chroma_persist_directory) / CHECKPOINT_FILENAME,
+        batch_size=batch_size,
+        max_concurrency=max_concurrency,
     )
-    vectorstore.persist()
+    create_lexical_index(corpus_path, Path(chroma_persist_directory) / LEXICAL_INDEX_FILENAME)
     return vectorstore
 
 
+def create_lexical_index(corpus_path: str | Path, index_path: str | Path) -> BM25Index:
+    index = BM25Index.from_chunks(iter_corpus(corpus_path))
+    index.save(index_path)
+    return index
+
+
 def load_vector_store(embeddings: Embeddings, chroma_persist_directory: str):
     return Chroma(persist_directory=chroma_persist_directory, embedding_function=embeddings)
@@ -0,0 +1,98 @@
+"""Line-delimited corpus of leaf chunks and RAPTOR summaries.
+
+Each line is a JSON object ``{"text": ..., "level": ..., "cluster": ...}`` where level 0
+holds the original statute chunks and higher levels hold RAPTOR cluster summaries.
+The file is read lazily, so indexing never keeps the whole corpus in memory.
+"""
+import argparse
+import gzip
+import json
+import logging
+import pickle
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+
+from core.constants import CHROMA_VECTORS, RAPTOR_CORPUS
+
+_logger = logging.getLogger(__name__)
+
+CorpusChunk = tuple[str, dict]
+
+
+def _open(path: str | Path, mode: str) -> IO[str]:
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def iter_corpus(path: str | Path = RAPTOR_CORPUS, max_level: int | None = None) -> Iterator[CorpusChunk]:
+    with _open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.pop("text")
+            if max_level is not None and record.get("level", 0) > max_level:
+                continue
+            yield text, record
+
+
+def write_corpus(path: str | Path, chunks: Iterable[CorpusChunk]) -> int:
+    written = 0
+    with _open(path, "w") as file:
+        for text, metadata in chunks:
+            file.write(json.dumps({"text": text, **metadata}, ensure_ascii=False))
+            file.write("\n")
+            written += 1
+    return written
+
+
+def iter_legacy_raptor_result(chunked_texts_path: str | Path, raptor_result_path: str | Path) -> Iterator[CorpusChunk]:
+    """Chunks from the old ``chunked_texts.json`` + ``saved_raptor_result.pkl`` pair (loaded in full, once)."""
+    with open(chunked_texts_path, "r") as f:
+        for text in json.load(f):
+            yield text, {"level": 0}
+
+    with open(raptor_result_path, "rb") as f:
+        raptor = pickle.load(f)
+    for level in sorted(raptor.keys()):
+        df_summary = raptor[level][1]
+        for text, cluster in zip(df_summary["summaries"], df_summary["cluster"]):
+            yield text, {"level": int(level), "cluster": int(cluster)}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Convert and index the RAPTOR corpus")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert the legacy pickle + JSON files to JSONL")
+    convert.add_argument("--chunked-texts", default="chunked_texts.json")
+    convert.add_argument("--raptor-result", default="saved_raptor_result.pkl")
+    convert.add_argument("--output", default=str(RAPTOR_CORPUS))
+
+    index = commands.add_parser("index", help="incrementally index a JSONL corpus into Chroma")
+    index.add_argument("--corpus", default=str(RAPTOR_CORPUS))
+    index.add_argument("--persist-directory", default=str(CHROMA_VECTORS))
+    index.add_argument("--batch-size", type=int, default=128)
+    index.add_argument("--max-concurrency", type=int, default=4)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "convert":
+        written = write_corpus(args.output, iter_legacy_raptor_result(args.chunked_texts, args.raptor_result))
+        _logger.info("Wrote %d chunks to %s", written, args.output)
+    elif args.command == "index":
+        from core.embdeddings import get_embeddings
+        from core.vectorstores.chroma import create_vector_store_from_corpus
+        create_vector_store_from_corpus(
+            get_embeddings(),
+            args.persist_directory,
+            args.corpus,
+            batch_size=args.batch_size,
+            max_concurrency=args.max_concurrency,
+        )
+
+
+if __name__ == "__main__":
+    main()
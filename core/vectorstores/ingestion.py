@@ -0,0 +1,194 @@
+import hashlib
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice, repeat
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores import Chroma
+
+_logger = logging.getLogger(__name__)
+
+Chunk = tuple[str, str, dict]
+
+
+def chunk_id(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestionCheckpoint:
+    """Append-only manifest of the chunk ids present in a collection.
+
+    Every committed batch appends ``+id`` lines and every deletion ``-id`` lines,
+    so a crashed run loses at most the batch in flight and resumes from the log.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.ids: set[str] = set()
+        if self.path.exists():
+            with open(self.path) as file:
+                for line in file:
+                    line = line.strip()
+                    if len(line) < 2:
+                        continue
+                    if line[0] == "+":
+                        self.ids.add(line[1:])
+                    elif line[0] == "-":
+                        self.ids.discard(line[1:])
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _append(self, sign: str, ids: Iterable[str]) -> None:
+        with open(self.path, "a") as file:
+            file.writelines(f"{sign}{id_}\n" for id_ in ids)
+
+    def record_added(self, ids: list[str]) -> None:
+        self._append("+", ids)
+        self.ids.update(ids)
+
+    def record_removed(self, ids: list[str]) -> None:
+        self._append("-", ids)
+        self.ids.difference_update(ids)
+
+    def compact(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as file:
+            file.writelines(f"+{id_}\n" for id_ in sorted(self.ids))
+        tmp_path.replace(self.path)
+
+
+def _scalar_metadata(metadata: dict | None) -> dict | None:
+    # Chroma only stores scalar metadata values, tree links such as ``children`` stay in the corpus file
+    metadata = {key: value for key, value in (metadata or {}).items() if isinstance(value, (str, int, float, bool))}
+    return metadata or None
+
+
+def _batched(chunks: Iterable[Chunk], batch_size: int) -> Iterator[list[Chunk]]:
+    chunks = iter(chunks)
+    while batch := list(islice(chunks, batch_size)):
+        yield batch
+
+
+def _embed_batch(embeddings: Embeddings, batch: list[Chunk]) -> tuple[list[Chunk], list[list[float]]]:
+    return batch, embeddings.embed_documents([text for _, text, _ in batch])
+
+
+def _migrate_legacy_ids(vectorstore: Chroma, batch_size: int) -> list[str]:
+    """Re-key rows stored under non content-hash ids (e.g. uuids) to ``chunk_id(document)``.
+
+    Stored embeddings are copied over, so a collection built before content-hash
+    ids is adopted by the checkpoint instead of being re-embedded and rebuilt.
+    Returns the ids present in the collection afterwards.
+    """
+    stored = vectorstore._collection.get(include=["documents"])
+    ids = {
+        id_: id_ if document is None else chunk_id(document)
+        for id_, document in zip(stored["ids"], stored["documents"])
+    }
+    legacy = [id_ for id_, new_id in ids.items() if id_ != new_id]
+    for start in range(0, len(legacy), batch_size):
+        batch = vectorstore._collection.get(
+            ids=legacy[start:start + batch_size], include=["documents", "embeddings", "metadatas"]
+        )
+        rows = {
+            ids[id_]: (document, embedding, metadata)
+            for id_, document, embedding, metadata in zip(
+                batch["ids"], batch["documents"], batch["embeddings"], batch["metadatas"]
+            )
+        }
+        vectorstore._collection.upsert(
+            ids=list(rows),
+            embeddings=[embedding for _, embedding, _ in rows.values()],
+            documents=[document for document, _, _ in rows.values()],
+            metadatas=[metadata or None for _, _, metadata in rows.values()],
+        )
+        vectorstore._collection.delete(ids=batch["ids"])
+    if legacy:
+        _logger.warning("Migrated %d chunks from legacy ids to content-hash ids without re-embedding", len(legacy))
+    return list(dict.fromkeys(ids.values()))
+
+
+def ingest_chunks(
+    vectorstore: Chroma,
+    embeddings: Embeddings,
+    chunks: Iterable[tuple[str, dict | None]],
+    checkpoint_path: str | Path,
+    batch_size: int = 128,
+    max_concurrency: int = 4,
+    delete_missing: bool = True,
+) -> dict[str, int]:
+    """Upsert only new ``(text, metadata)`` chunks and delete the ones no longer in ``chunks``.
+
+    Chunks get a content-hash id, so a changed chunk is an insert plus a delete.
+    On the first run (no checkpoint yet) rows under legacy ids are re-keyed by
+    content, keeping their embeddings, before the diff is computed. Batches are embedded concurrently (at most ``max_concurrency`` in flight) and
+    written in order, each one recorded in the checkpoint right after its upsert.
+    """
+    checkpoint = IngestionCheckpoint(checkpoint_path)
+    if not checkpoint.exists():
+        existing = _migrate_legacy_ids(vectorstore, batch_size)
+        if existing:
+            checkpoint.record_added(existing)
+
+    seen: set[str] = set()
+
+    def pending_chunks() -> Iterator[Chunk]:
+        for text, metadata in chunks:
+            id_ = chunk_id(text)
+            if id_ in seen:
+                continue
+            seen.add(id_)
+            if id_ not in checkpoint.ids:
+                yield id_, text, metadata
+
+    def commit(future: Future) -> int:
+        batch, vectors = future.result()
+        ids = [id_ for id_, _, _ in batch]
+        vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[text for _, text, _ in batch],
+            metadatas=[_scalar_metadata(metadata) for _, _, metadata in batch],
+        )
+        checkpoint.record_added(ids)
+        _logger.info("Upserted %d chunks, %d in collection", len(ids), len(checkpoint.ids))
+        return len(ids)
+
+    added = 0
+    in_flight: deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        for batch in _batched(pending_chunks(), batch_size):
+            in_flight.append(executor.submit(_embed_batch, embeddings, batch))
+            if len(in_flight) >= max_concurrency:
+                added += commit(in_flight.popleft())
+        while in_flight:
+            added += commit(in_flight.popleft())
+
+    removed = 0
+    if delete_missing:
+        stale = sorted(checkpoint.ids - seen)
+        for start in range(0, len(stale), batch_size):
+            ids = stale[start:start + batch_size]
+            vectorstore.delete(ids=ids)
+            checkpoint.record_removed(ids)
+            removed += len(ids)
+
+    checkpoint.compact()
+    _logger.info("Ingestion finished: %d added, %d removed, %d total", added, removed, len(checkpoint.ids))
+    return {"added": added, "removed": removed, "total": len(checkpoint.ids)}
+
+
+def ingest_texts(
+    vectorstore: Chroma,
+    embeddings: Embeddings,
+    texts: Iterable[str],
+    checkpoint_path: str | Path,
+    metadatas: Iterable[dict] | None = None,
+    **kwargs,
+) -> dict[str, int]:
+    chunks = zip(texts, metadatas if metadatas is not None else repeat(None))
+    return ingest_chunks(vectorstore, embeddings, chunks, checkpoint_path, **kwargs)
@@ -0,0 +1,34 @@
+from langchain.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+
+class GradeGeneration(BaseModel):
+    """Binary scores for grounding and usefulness of a generation, graded together."""
+
+    grounded: str = Field(
+        description="Answer is grounded in the facts, 'yes' or 'no'"
+    )
+    useful: str = Field(
+        description="Answer addresses the question, 'yes' or 'no'"
+    )
+
+
+SYSTEM_PROMPT = """
+You are a grader assessing an LLM generation against a set of retrieved facts and a user question. \n 
+Give two binary scores 'yes' or 'no'. \n
+'grounded': 'yes' means that the answer is grounded in / supported by the set of facts. \n
+'useful': 'yes' means that the answer resolves the question.
+"""
+
+
+def build_generation_grading_chain():
+    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    structured_llm_grader = llm.with_structured_output(GradeGeneration)
+    grading_prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", SYSTEM_PROMPT),
+            ("human", "Set of facts: \n\n {documents} \n\n User question: {question} \n\n LLM generation: {generation}"),
+        ]
+    )
+    return grading_prompt | structured_llm_grader
@@ -0,0 +1,59 @@
+from functools import lru_cache
+from typing import Literal
+
+from langchain.chat_models.base import BaseChatModel
+from langchain_core.output_parsers.openai_tools import PydanticToolsParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_openai import ChatOpenAI
+from pydantic import Field
+
+from core.caches.memo import QuestionMemo
+from core.chains.query_evaluation import QuestionEvaluation
+
+
+class QuestionPreprocessing(QuestionEvaluation):
+    """User legal question/query evaluation, routing and rewrite for retrieval"""
+    datasource: Literal["vectorstore", "web_search"] = Field(
+        description="""
+            Route the question to the vectorstore of Illinois statutes when it is about
+            Illinois law, otherwise to web search.
+        """
+    )
+    rewritten_question: str = Field(
+        description="""
+            The question rewritten for vectorstore retrieval: same meaning,
+            explicit legal terms, no conversational filler.
+        """
+    )
+
+
+PROMPT = """
+As an input you have an user question in legal advisor application.
+You have to look at this question carefully and analyze it.
+Analysis consists of multiple steps:
+1. Classify the following question into one of the categories
+2. Is RAG usefully to answer this question?
+3. Check if this question is difficult based on different aspects
+4. Check if question related to Illinois state law
+5. Choose the datasource: the vectorstore of Illinois statutes or web search
+6. Rewrite the question so it is optimized for vectorstore retrieval
+
+Question:
+{question}
+"""
+
+
+@lru_cache(maxsize=None)
+def preprocessing_tool() -> dict:
+    return convert_to_openai_tool(QuestionPreprocessing)
+
+
+def build_preprocessing_chain(llm: BaseChatModel | None = None, memo: QuestionMemo | None = None) -> Runnable:
+    """Evaluation, route and rewritten question from one tool call, memoized per normalized question."""
+    llm = llm or ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    llm_with_tools = llm.bind_tools([preprocessing_tool()], tool_choice=QuestionPreprocessing.__name__)
+    template = ChatPromptTemplate.from_messages([("human", PROMPT)])
+    chain = template | llm_with_tools | PydanticToolsParser(tools=[QuestionPreprocessing], first_tool_only=True)
+    return (memo or QuestionMemo()).wrap(chain, name="QuestionPreprocessing")
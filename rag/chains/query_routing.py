@@ -29,3 +29,11 @@ def build_routing_chain():
         ]
     )
     return route_prompt | structured_llm_router
+
+
+def route_labels(route: RouteQuery) -> dict[str, str]:
+    return {"datasource": route.datasource}
+
+
+def route_from_labels(labels: dict[str, str], confidence: float) -> RouteQuery:
+    return RouteQuery(datasource=labels["datasource"])
@@ -1,5 +1,5 @@
 from langchain_openai import ChatOpenAI
-from langchain.output_parsers import StrOutputParser
+from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import ChatPromptTemplate
 
 
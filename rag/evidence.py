@@ -0,0 +1,127 @@
+"""Compress retrieved documents to the sentences that best support a generation.
+
+Sentences are scored against every sentence of the generation by TF-IDF cosine
+similarity, optionally blended with embedding similarity. Each generation sentence
+first gets its best supporting sentence, then the budget is filled by overall score.
+The sentence split and sentence vectors only depend on the documents, so they are
+cached in ``EvidenceCache`` and reused while the graph regenerates over the same documents.
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain_core.documents import Document
+from pydantic import BaseModel, ConfigDict
+
+from core.tokens import count_tokens
+from core.retrievers.bm25 import tokenize
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+def split_sentences(text: str, min_tokens: int = 3) -> list[str]:
+    return [s.strip() for s in SENTENCE_PATTERN.split(text) if len(tokenize(s)) >= min_tokens]
+
+
+def document_texts(documents) -> list[str]:
+    if isinstance(documents, (str, Document)):
+        documents = [documents]
+    return [d.page_content if isinstance(d, Document) else str(d) for d in documents or []]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class EvidenceCache(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    key: str
+    sentences: list[str]
+    idf: np.ndarray
+    lexical: np.ndarray
+    semantic: np.ndarray | None = None
+
+
+class EvidenceCompressor(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings | None = None
+    token_budget: int = 800
+    lexical_weight: float = 0.6
+    dimensions: int = 4096
+
+    @staticmethod
+    def documents_key(documents) -> str:
+        return hashlib.sha1("\x00".join(document_texts(documents)).encode("utf-8")).hexdigest()
+
+    def _counts(self, texts: list[str]) -> np.ndarray:
+        counts = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            columns = [zlib.crc32(token.encode("utf-8")) % self.dimensions for token in tokenize(text)]
+            np.add.at(counts[row], columns, 1.0)
+        return counts
+
+    def _index(self, documents) -> EvidenceCache:
+        sentences = [s for text in document_texts(documents) for s in split_sentences(text)]
+        counts = self._counts(sentences)
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((len(sentences) + 1) / (document_frequency + 1)) + 1
+        return EvidenceCache(
+            key=self.documents_key(documents), sentences=sentences, idf=idf,
+            lexical=_normalize_rows(counts * idf),
+        )
+
+    def _scores(self, cache: EvidenceCache, claims: list[str], claim_vectors: np.ndarray | None) -> np.ndarray:
+        scores = _normalize_rows(self._counts(claims) * cache.idf) @ cache.lexical.T
+        if claim_vectors is not None and cache.semantic is not None:
+            semantic = _normalize_rows(claim_vectors) @ cache.semantic.T
+            scores = self.lexical_weight * scores + (1 - self.lexical_weight) * semantic
+        return scores
+
+    def _select(self, cache: EvidenceCache, scores: np.ndarray) -> str:
+        # every claim gets its best support before the remaining budget goes to overall best
+        best_per_claim = scores.argmax(axis=1)[np.argsort(-scores.max(axis=1), kind="stable")]
+        support = scores.max(axis=0)
+        by_score = np.argsort(-support, kind="stable")
+        candidates = [idx for idx in dict.fromkeys([*best_per_claim.tolist(), *by_score.tolist()]) if support[idx] > 0]
+        selected, used = [], 0
+        for idx in candidates or by_score.tolist():
+            tokens = count_tokens(cache.sentences[idx])
+            if used + tokens > self.token_budget:
+                continue
+            selected.append(idx)
+            used += tokens
+        return "\n".join(cache.sentences[idx] for idx in sorted(selected))
+
+    def _prepare(self, documents, generation: str, cache: EvidenceCache | None) -> tuple[EvidenceCache, list[str]]:
+        if cache is None or cache.key != self.documents_key(documents):
+            cache = self._index(documents)
+        return cache, split_sentences(generation, min_tokens=1) or [generation]
+
+    def compress(self, documents, generation: str, cache: EvidenceCache | None = None) -> tuple[str, EvidenceCache]:
+        cache, claims = self._prepare(documents, generation, cache)
+        if not cache.sentences:
+            return "", cache
+        claim_vectors = None
+        if self.embeddings is not None:
+            if cache.semantic is None:
+                cache.semantic = _normalize_rows(np.asarray(self.embeddings.embed_documents(cache.sentences)))
+            claim_vectors = np.asarray(self.embeddings.embed_documents(claims))
+        return self._select(cache, self._scores(cache, claims, claim_vectors)), cache
+
+    async def acompress(
+        self, documents, generation: str, cache: EvidenceCache | None = None
+    ) -> tuple[str, EvidenceCache]:
+        cache, claims = self._prepare(documents, generation, cache)
+        if not cache.sentences:
+            return "", cache
+        claim_vectors = None
+        if self.embeddings is not None:
+            if cache.semantic is None:
+                cache.semantic = _normalize_rows(np.asarray(await self.embeddings.aembed_documents(cache.sentences)))
+            claim_vectors = np.asarray(await self.embeddings.aembed_documents(claims))
+        return self._select(cache, self._scores(cache, claims, claim_vectors)), cache
@@ -1,14 +1,86 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from typing import Literal
 
 from langchain_core.retrievers import BaseRetriever
 from langchain.schema import Document
-from langchain_core.runnables import Runnable
-from pydantic import BaseModel
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, ConfigDict, Field
 
-from rag.state import GraphState
+from core.dedup import near_duplicates
+from core.tokens import count_tokens
+from rag.evidence import EvidenceCompressor, document_texts
+from core.retrievers.hybrid import reciprocal_rank_fusion
+from core.retrievers.raptor import pack_documents
+from rag.state import GenerationGrade, GraphState, RequestBudget
+
+GRADE_RANK: dict[GenerationGrade, int] = {"not supported": 0, "not useful": 1, "useful": 2}
+FALLBACK_ANSWER = "I could not find a well supported answer to this question within the request budget."
+
+
+_texts = document_texts
+
+
+def _spend(state: GraphState, *texts: str) -> dict:
+    """Estimated token cost of an LLM call over ``texts``, added to the request total."""
+    return {"tokens_used": state.get("tokens_used", 0) + sum(count_tokens(text) for text in texts)}
+
+
+def _asked(state: GraphState) -> str:
+    """The user's question; ``question`` may hold a rewrite tuned for retrieval."""
+    return state.get("original_question") or state["question"]
+
+
+def budget_exhausted(state: GraphState) -> str | None:
+    budget = state["budget"]
+    if state["deadline"] is not None and time.time() >= state["deadline"]:
+        return "deadline"
+    if budget.max_tokens is not None and state["tokens_used"] >= budget.max_tokens:
+        return "tokens"
+    return None
+
+
+class RequestBudgetNode(BaseModel):
+    """Entry node, starts the request clock and resets the budget counters."""
+    budget: RequestBudget = Field(default_factory=RequestBudget)
+
+    def __call__(self, state: GraphState):
+        budget = state.get("budget") or self.budget
+        return {
+            "budget": budget,
+            "deadline": time.time() + budget.deadline_seconds if budget.deadline_seconds is not None else None,
+            "rewrites": 0,
+            "regenerations": 0,
+            "tokens_used": 0,
+            "best_generation": None,
+            "best_grade": None,
+            "degraded": None,
+            "original_question": state["question"],
+        }
+
+    async def acall(self, state: GraphState):
+        return self(state)
+
+
+class FinalizeNode(BaseModel):
+    """Ends a request whose budget ran out with the best generation graded so far."""
+
+    def __call__(self, state: GraphState):
+        budget = state["budget"]
+        reason = budget_exhausted(state)
+        if reason is None:
+            reason = "max_regenerations" if state["regenerations"] > budget.max_regenerations else "max_rewrites"
+        return {"generation": state.get("best_generation") or FALLBACK_ANSWER, "degraded": reason}
+
+    async def acall(self, state: GraphState):
+        return self(state)
 
 
 class RetrieveDocumentsNode(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     retriever: BaseRetriever
 
     def __call__(self, state: GraphState):
@@ -16,93 +88,388 @@ class RetrieveDocumentsNode(BaseModel):
         documents = self.retriever.invoke(question)
         return {"documents": documents, "question": question}
 
+    async def acall(self, state: GraphState):
+        question = state["question"]
+        documents = await self.retriever.ainvoke(question)
+        return {"documents": documents, "question": question}
+
 
 class GenerateNode(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     rag_chain: Runnable
 
     def __call__(self, state: GraphState):
         question = state["question"]
         documents = state["documents"]
-        generation = self.rag_chain.invoke({"context": documents, "question": question})
-        return {"documents": documents, "question": question, "generation": generation}
+        generation = self.rag_chain.invoke({"context": documents, "question": _asked(state)})
+        return {
+            "documents": documents, "question": question, "generation": generation,
+            **_spend(state, _asked(state), generation, *_texts(documents)),
+        }
+
+    async def acall(self, state: GraphState):
+        question = state["question"]
+        documents = state["documents"]
+        generation = await self.rag_chain.ainvoke({"context": documents, "question": _asked(state)})
+        return {
+            "documents": documents, "question": question, "generation": generation,
+            **_spend(state, _asked(state), generation, *_texts(documents)),
+        }
 
 
 class DocumentsGradingNode(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     retrieval_grader: Runnable
+    max_concurrency: int | None = Field(
+        default=None,
+        description="Maximum number of documents graded at the same time, unbounded if not set"
+    )
+    min_relevant_documents: int | None = Field(
+        default=None,
+        description="Stop grading as soon as this many relevant documents are found"
+    )
+
+    def _has_enough(self, relevant: list[int]) -> bool:
+        return self.min_relevant_documents is not None and len(relevant) >= self.min_relevant_documents
 
     def __call__(self, state: GraphState):
         question = state["question"]
         documents = state["documents"]
 
-        filtered_docs = []
-        for d in documents:
-            score = self.retrieval_grader.invoke(
-                {"question": question, "document": d.page_content}
-            )
-            grade = score.binary_score
-            if grade == "yes":
-                filtered_docs.append(d)
-            else:
-                continue
-        return {"documents": filtered_docs, "question": question}
+        inputs = [{"question": question, "document": d.page_content} for d in documents]
+        graded = self.retrieval_grader.batch_as_completed(
+            inputs, config={"max_concurrency": self.max_concurrency}
+        )
+        relevant = []
+        with closing(graded):
+            for idx, score in graded:
+                if score.binary_score == "yes":
+                    relevant.append(idx)
+                    if self._has_enough(relevant):
+                        break
+        filtered_docs = [documents[idx] for idx in sorted(relevant)]
+        return {
+            "documents": filtered_docs, "question": question,
+            **_spend(state, *(question + text for text in _texts(documents))),
+        }
+
+    async def acall(self, state: GraphState):
+        question = state["question"]
+        documents = state["documents"]
+
+        semaphore = asyncio.Semaphore(self.max_concurrency or max(len(documents), 1))
+
+        async def grade(idx: int, document: Document):
+            async with semaphore:
+                score = await self.retrieval_grader.ainvoke(
+                    {"question": question, "document": document.page_content}
+                )
+            return idx, score
+
+        tasks = [asyncio.create_task(grade(idx, d)) for idx, d in enumerate(documents)]
+        relevant = []
+        try:
+            for next_graded in asyncio.as_completed(tasks):
+                idx, score = await next_graded
+                if score.binary_score == "yes":
+                    relevant.append(idx)
+                    if self._has_enough(relevant):
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+        filtered_docs = [documents[idx] for idx in sorted(relevant)]
+        return {
+            "documents": filtered_docs, "question": question,
+            **_spend(state, *(question + text for text in _texts(documents))),
+        }
 
 
 class QuestionRewritingNode(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     question_rewriter: Runnable
 
     def __call__(self, state: GraphState):
         question = state["question"]
         documents = state["documents"]
         better_question = self.question_rewriter.invoke({"question": question})
-        return {"documents": documents, "question": better_question}
+        return {
+            "documents": documents, "question": better_question, "rewrites": state.get("rewrites", 0) + 1,
+            **_spend(state, question, better_question),
+        }
+
+    async def acall(self, state: GraphState):
+        question = state["question"]
+        documents = state["documents"]
+        better_question = await self.question_rewriter.ainvoke({"question": question})
+        return {
+            "documents": documents, "question": better_question, "rewrites": state.get("rewrites", 0) + 1,
+            **_spend(state, question, better_question),
+        }
 
 
-class WebSearchNode:
-    web_search_tool: Runnable
+class WebSearchNode(BaseModel):
+    """Searches the question (and the user's original wording, when it was rewritten) concurrently.
+
+    Results are fused per source, near-duplicate snippets are dropped and the rest is
+    trimmed to ``token_budget``. Each kept result is its own ``Document`` with the source URL.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retriever: BaseRetriever
+    token_budget: int = 2000
+    duplicate_threshold: float = Field(default=0.8, description="Estimated Jaccard similarity of duplicates")
+
+    @staticmethod
+    def _queries(state: GraphState) -> list[str]:
+        return list(dict.fromkeys(q for q in (state["question"], state.get("original_question")) if q))
+
+    def _select(self, rankings: list[list[Document]]) -> list[Document]:
+        fused = reciprocal_rank_fusion(rankings)
+        duplicates = set(near_duplicates([d.page_content for d, _ in fused], self.duplicate_threshold))
+        return pack_documents([pair for idx, pair in enumerate(fused) if idx not in duplicates], self.token_budget)
 
     def __call__(self, state: GraphState):
         question = state["question"]
-        docs = self.web_search_tool.invoke({"query": question})
-        web_results = "\n".join([d["content"] for d in docs])
-        web_results = Document(page_content=web_results)
-        return {"documents": web_results, "question": question}
+        rankings = self.retriever.batch(self._queries(state))
+        return {"documents": self._select(rankings), "question": question}
+
+    async def acall(self, state: GraphState):
+        question = state["question"]
+        rankings = await self.retriever.abatch(self._queries(state))
+        return {"documents": self._select(rankings), "question": question}
 
 
 class QuestionRoutingNode(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     question_router: Runnable
 
-    def __call__(self, state: GraphState) -> Literal["web_search", "vectorstore"]:
-        question = state["question"]
-        source = self.question_router.invoke({"question": question})
+    @staticmethod
+    def _route(source) -> Literal["web_search", "vectorstore"]:
         if source.datasource == "web_search":
             return "web_search"
         elif source.datasource == "vectorstore":
             return "vectorstore"
 
+    def __call__(self, state: GraphState) -> Literal["web_search", "vectorstore"]:
+        question = state["question"]
+        source = self.question_router.invoke({"question": question})
+        return self._route(source)
+
+    async def acall(self, state: GraphState) -> Literal["web_search", "vectorstore"]:
+        question = state["question"]
+        source = await self.question_router.ainvoke({"question": question})
+        return self._route(source)
+
+
+class SpeculativeRoutingNode(BaseModel):
+    """Run the router while retrieval (and optionally web search) is already in flight.
+
+    Only the branch picked by the router is kept, the other one is cancelled.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    router: QuestionRoutingNode
+    retrieve: RetrieveDocumentsNode
+    web_search: WebSearchNode | None = None
+
+    def _branches(self) -> dict[str, object]:
+        branches = {"vectorstore": self.retrieve}
+        if self.web_search is not None:
+            branches["web_search"] = self.web_search
+        return branches
+
+    def __call__(self, state: GraphState):
+        branches = self._branches()
+        executor = ThreadPoolExecutor(max_workers=len(branches) + 1)
+        try:
+            route = executor.submit(self.router, state)
+            futures = {name: executor.submit(node, state) for name, node in branches.items()}
+            datasource = route.result()
+            result = {"question": state["question"], "datasource": datasource}
+            if datasource in futures:
+                result.update(futures[datasource].result())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return result
+
+    async def acall(self, state: GraphState):
+        route = asyncio.create_task(self.router.acall(state))
+        tasks = {name: asyncio.create_task(node.acall(state)) for name, node in self._branches().items()}
+        datasource = None
+        try:
+            datasource = await route
+        finally:
+            for name, task in tasks.items():
+                if name != datasource:
+                    task.cancel()
+        result = {"question": state["question"], "datasource": datasource}
+        if datasource in tasks:
+            result.update(await tasks[datasource])
+        return result
+
+
+class PreprocessingNode(BaseModel):
+    """Evaluates, routes and rewrites the question with a single preprocessing call.
+
+    The rewrite becomes ``question``, which retrieval uses. Generation and grading keep ``original_question``.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    preprocessor: Runnable
+
+    @staticmethod
+    def _update(question: str, preprocessing) -> dict:
+        return {
+            "question": preprocessing.rewritten_question or question,
+            "original_question": question,
+            "datasource": preprocessing.datasource,
+            "evaluation": preprocessing,
+        }
+
+    def __call__(self, state: GraphState):
+        question = state["question"]
+        return self._update(question, self.preprocessor.invoke({"question": question}))
+
+    async def acall(self, state: GraphState):
+        question = state["question"]
+        return self._update(question, await self.preprocessor.ainvoke({"question": question}))
+
+
+def decide_speculative_route(state: GraphState) -> Literal["web_search", "vectorstore"]:
+    return "web_search" if state.get("datasource") == "web_search" else "vectorstore"
+
 
 def decide_to_generate(state: GraphState):
-    filtered_documents = state["documents"]
-    return "transform_query" if not filtered_documents else "generate"
+    if state["documents"]:
+        return "generate"
+    if state["rewrites"] < state["budget"].max_rewrites and budget_exhausted(state) is None:
+        return "transform_query"
+    return "finalize" if state["best_generation"] else "generate"
+
+
+def decide_after_grading(state: GraphState) -> Literal["useful", "not useful", "not supported", "finalize"]:
+    grade = state["generation_grade"]
+    if grade == "useful":
+        return "useful"
+    if budget_exhausted(state) is not None:
+        return "finalize"
+    if grade == "not supported":
+        return grade if state["regenerations"] <= state["budget"].max_regenerations else "finalize"
+    return grade if state["rewrites"] < state["budget"].max_rewrites else "finalize"
+
+
+def _evidence(state: GraphState, compressor: EvidenceCompressor | None) -> tuple[list | str, dict]:
+    """Documents to show the grader, and the state update caching their compression."""
+    if compressor is None:
+        return state["documents"], {}
+    evidence, cache = compressor.compress(state["documents"], state["generation"], state.get("evidence_cache"))
+    return evidence, {"evidence": evidence, "evidence_cache": cache}
+
+
+async def _aevidence(state: GraphState, compressor: EvidenceCompressor | None) -> tuple[list | str, dict]:
+    if compressor is None:
+        return state["documents"], {}
+    evidence, cache = await compressor.acompress(state["documents"], state["generation"], state.get("evidence_cache"))
+    return evidence, {"evidence": evidence, "evidence_cache": cache}
+
+
+def _grade_update(state: GraphState, grade: GenerationGrade, spent: dict) -> dict:
+    update = {"generation_grade": grade, **spent}
+    if grade == "not supported":
+        update["regenerations"] = state.get("regenerations", 0) + 1
+    best = state.get("best_grade")
+    if best is None or GRADE_RANK[grade] > GRADE_RANK[best]:
+        update["best_generation"], update["best_grade"] = state["generation"], grade
+    return update
 
 
 class HallucinationGradingNode(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     hallucination_grader: Runnable
     answer_grader: Runnable
+    compressor: EvidenceCompressor | None = None
 
     def __call__(self, state: GraphState):
-        question = state["question"]
-        documents = state["documents"]
+        question = _asked(state)
+        documents, evidence = _evidence(state, self.compressor)
         generation = state["generation"]
+        spent = {**_spend(state, generation, *_texts(documents)), **evidence}
 
         score = self.hallucination_grader.invoke({"documents": documents, "generation": generation})
         grade = score.binary_score
 
         if grade == "yes":
+            spent["tokens_used"] += count_tokens(question) + count_tokens(generation)
             score = self.answer_grader.invoke({"question": question, "generation": generation})
             grade = score.binary_score
             if grade == "yes":
-                return "useful"
+                return _grade_update(state, "useful", spent)
             else:
-                return "not useful"
+                return _grade_update(state, "not useful", spent)
         else:
+            return _grade_update(state, "not supported", spent)
+
+    async def acall(self, state: GraphState):
+        question = _asked(state)
+        documents, evidence = await _aevidence(state, self.compressor)
+        generation = state["generation"]
+        spent = {**_spend(state, generation, *_texts(documents)), **evidence}
+
+        score = await self.hallucination_grader.ainvoke({"documents": documents, "generation": generation})
+        grade = score.binary_score
+
+        if grade == "yes":
+            spent["tokens_used"] += count_tokens(question) + count_tokens(generation)
+            score = await self.answer_grader.ainvoke({"question": question, "generation": generation})
+            grade = score.binary_score
+            if grade == "yes":
+                return _grade_update(state, "useful", spent)
+            else:
+                return _grade_update(state, "not useful", spent)
+        else:
+            return _grade_update(state, "not supported", spent)
+
+
+class CombinedGenerationGradingNode(BaseModel):
+    """Grades grounding and usefulness in a single structured call."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    generation_grader: Runnable
+    compressor: EvidenceCompressor | None = None
+
+    @staticmethod
+    def _grade(score) -> GenerationGrade:
+        if score.grounded != "yes":
             return "not supported"
+        return "useful" if score.useful == "yes" else "not useful"
+
+    def __call__(self, state: GraphState):
+        question = _asked(state)
+        documents, evidence = _evidence(state, self.compressor)
+        generation = state["generation"]
+        score = self.generation_grader.invoke(
+            {"documents": documents, "question": question, "generation": generation}
+        )
+        spent = {**_spend(state, question, generation, *_texts(documents)), **evidence}
+        return _grade_update(state, self._grade(score), spent)
+
+    async def acall(self, state: GraphState):
+        question = _asked(state)
+        documents, evidence = await _aevidence(state, self.compressor)
+        generation = state["generation"]
+        score = await self.generation_grader.ainvoke(
+            {"documents": documents, "question": question, "generation": generation}
+        )
+        spent = {**_spend(state, question, generation, *_texts(documents)), **evidence}
+        return _grade_update(state, self._grade(score), spent)
+
+
+def as_runnable(node) -> Runnable:
+    """Wrap a node so the graph uses ``__call__`` on ``invoke`` and ``acall`` on ``ainvoke``."""
+    return RunnableLambda(node.__call__, afunc=node.acall, name=type(node).__name__)
@@ -1,7 +1,35 @@
-from typing import TypedDict
+from typing import Literal, TypedDict
+
+from pydantic import BaseModel, Field
+
+from core.chains.query_evaluation import QuestionEvaluation
+from rag.evidence import EvidenceCache
+
+GenerationGrade = Literal["useful", "not useful", "not supported"]
+
+
+class RequestBudget(BaseModel):
+    max_rewrites: int = Field(default=2, description="Question rewrites allowed after irrelevant retrievals")
+    max_regenerations: int = Field(default=2, description="Regenerations allowed after unsupported answers")
+    deadline_seconds: float | None = Field(default=60.0, description="Wall-clock limit for the whole request")
+    max_tokens: int | None = Field(default=60_000, description="Estimated prompt and completion tokens allowed")
 
 
 class GraphState(TypedDict):
     question: str
+    original_question: str
+    evaluation: QuestionEvaluation | None
     generation: str
     documents: list[str]
+    datasource: str
+    budget: RequestBudget
+    deadline: float | None
+    rewrites: int
+    regenerations: int
+    tokens_used: int
+    generation_grade: GenerationGrade
+    best_generation: str | None
+    best_grade: GenerationGrade | None
+    degraded: str | None
+    evidence: str | None
+    evidence_cache: EvidenceCache | None
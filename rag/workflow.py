@@ -1,11 +1,23 @@
+from typing import Literal
+
+from langchain.embeddings.base import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, StateGraph, START
+from langgraph.graph.state import CompiledStateGraph
+
+from core.chains.google_search import build_google_search_retriever
+from core.classifiers.local import LocalClassifierTier
 
 from rag.chains.answer_grading import build_answer_grading_chain
 from rag.chains.document_grading import build_grading_chain
+from rag.chains.generation_grading import build_generation_grading_chain
 from rag.chains.hallucination_grading import build_hallucination_grading_chain
-from rag.chains.query_routing import build_routing_chain
+from rag.chains.preprocessing import build_preprocessing_chain
+from rag.chains.query_routing import build_routing_chain, route_from_labels, route_labels
 from rag.chains.question_rewriting import build_rewriting_chain
 from rag.chains.rag_generation import build_rag_generation_chain
+from rag.evidence import EvidenceCompressor
 from rag.node import (
     QuestionRewritingNode,
     DocumentsGradingNode,
@@ -13,45 +25,140 @@ from rag.node import (
     RetrieveDocumentsNode,
     GenerateNode,
     QuestionRoutingNode,
+    SpeculativeRoutingNode,
+    PreprocessingNode,
+    decide_speculative_route,
     decide_to_generate,
-    HallucinationGradingNode
+    decide_after_grading,
+    HallucinationGradingNode,
+    CombinedGenerationGradingNode,
+    RequestBudgetNode,
+    FinalizeNode,
+    as_runnable,
 )
-from rag.state import GraphState
+from rag.state import GraphState, RequestBudget
+
 
+def build_langgraph_workflow(
+    retriever: BaseRetriever,
+    grading_max_concurrency: int | None = None,
+    min_relevant_documents: int | None = None,
+    speculative_routing: bool = False,
+    speculative_web_search: bool = False,
+    budget: RequestBudget | None = None,
+    generation_grading: Literal["separate", "combined"] = "separate",
+    local_classifier: LocalClassifierTier | None = None,
+    unified_preprocessing: bool = False,
+    web_search_retriever: BaseRetriever | None = None,
+    web_search_token_budget: int = 2000,
+    compress_evidence: bool = True,
+    evidence_token_budget: int = 800,
+    evidence_embeddings: Embeddings | None = None,
+) -> StateGraph:
+    if unified_preprocessing and speculative_routing:
+        raise ValueError("unified_preprocessing already routes in its single call, it can't be speculative")
 
-def build_langgraph_workflow()  -> StateGraph:
     question_rewriter = build_rewriting_chain()
     retrieval_grader = build_grading_chain()
     rag_chain = build_rag_generation_chain()
     routing_chain = build_routing_chain()
-    hallucination_grading_chain = build_hallucination_grading_chain()
-    answer_grading_chain = build_answer_grading_chain()
+    if local_classifier is not None:
+        routing_chain = local_classifier.wrap(routing_chain, "routing", route_labels, route_from_labels)
+    compressor = None
+    if compress_evidence:
+        compressor = EvidenceCompressor(embeddings=evidence_embeddings, token_budget=evidence_token_budget)
+    if generation_grading == "combined":
+        generation_grading_node = CombinedGenerationGradingNode(
+            generation_grader=build_generation_grading_chain(),
+            compressor=compressor,
+        )
+    else:
+        generation_grading_node = HallucinationGradingNode(
+            hallucination_grader=build_hallucination_grading_chain(),
+            answer_grader=build_answer_grading_chain(),
+            compressor=compressor,
+        )
+
+    web_search_node = WebSearchNode(
+        retriever=web_search_retriever or build_google_search_retriever(),
+        token_budget=web_search_token_budget,
+    )
+    retrieve_node = RetrieveDocumentsNode(retriever=retriever)
+    routing_node = QuestionRoutingNode(question_router=routing_chain)
 
     workflow = StateGraph(GraphState)
-    workflow.add_node("web_search", WebSearchNode())
-    workflow.add_node("retrieve", RetrieveDocumentsNode(retriever=None))
-    workflow.add_node("grade_documents", DocumentsGradingNode(retrieval_grader=retrieval_grader))  # grade documents
-    workflow.add_node("generate", GenerateNode(rag_chain=rag_chain))
-    workflow.add_node("transform_query", QuestionRewritingNode(question_rewriter=question_rewriter))
-    workflow.add_conditional_edges(
-        START,
-        QuestionRoutingNode(question_router=routing_chain),
-        {"web_search": "web_search", "vectorstore": "retrieve"},
+    workflow.add_node("start_budget", as_runnable(RequestBudgetNode(budget=budget or RequestBudget())))
+    workflow.add_edge(START, "start_budget")
+    workflow.add_node("web_search", as_runnable(web_search_node))
+    workflow.add_node("retrieve", as_runnable(retrieve_node))
+    workflow.add_node(
+        "grade_documents",
+        as_runnable(DocumentsGradingNode(
+            retrieval_grader=retrieval_grader,
+            max_concurrency=grading_max_concurrency,
+            min_relevant_documents=min_relevant_documents,
+        ))
     )
+    workflow.add_node("generate", as_runnable(GenerateNode(rag_chain=rag_chain)))
+    workflow.add_node("transform_query", as_runnable(QuestionRewritingNode(question_rewriter=question_rewriter)))
+    workflow.add_node("grade_generation", as_runnable(generation_grading_node))
+    workflow.add_node("finalize", as_runnable(FinalizeNode()))
+    if unified_preprocessing:
+        workflow.add_node("preprocess", as_runnable(PreprocessingNode(preprocessor=build_preprocessing_chain())))
+        workflow.add_edge("start_budget", "preprocess")
+        workflow.add_conditional_edges(
+            "preprocess",
+            decide_speculative_route,
+            {"web_search": "web_search", "vectorstore": "retrieve"},
+        )
+    elif speculative_routing:
+        workflow.add_node("route", as_runnable(SpeculativeRoutingNode(
+            router=routing_node,
+            retrieve=retrieve_node,
+            web_search=web_search_node if speculative_web_search else None,
+        )))
+        workflow.add_edge("start_budget", "route")
+        workflow.add_conditional_edges(
+            "route",
+            decide_speculative_route,
+            {
+                "web_search": "generate" if speculative_web_search else "web_search",
+                "vectorstore": "grade_documents",
+            },
+        )
+    else:
+        workflow.add_conditional_edges(
+            "start_budget",
+            as_runnable(routing_node),
+            {"web_search": "web_search", "vectorstore": "retrieve"},
+        )
     workflow.add_edge("web_search", "generate")
     workflow.add_edge("retrieve", "grade_documents")
     workflow.add_conditional_edges(
         "grade_documents",
         decide_to_generate,
-        {"transform_query": "transform_query", "generate": "generate"},
+        {"transform_query": "transform_query", "generate": "generate", "finalize": "finalize"},
     )
     workflow.add_edge("transform_query", "retrieve")
+    workflow.add_edge("generate", "grade_generation")
     workflow.add_conditional_edges(
-        "generate",
-        HallucinationGradingNode(
-            hallucination_grader=hallucination_grading_chain,
-            answer_grader=answer_grading_chain
-        ),
-        {"not supported": "generate", "useful": END, "not useful": "transform_query"},
+        "grade_generation",
+        decide_after_grading,
+        {"not supported": "generate", "useful": END, "not useful": "transform_query", "finalize": "finalize"},
     )
+    workflow.add_edge("finalize", END)
     return workflow
+
+
+def build_async_langgraph_app(retriever: BaseRetriever, **kwargs) -> CompiledStateGraph:
+    return build_langgraph_workflow(retriever, **kwargs).compile()
+
+
+async def answer_question(
+    app: CompiledStateGraph,
+    question: str,
+    config: RunnableConfig | None = None,
+    budget: RequestBudget | None = None,
+) -> GraphState:
+    inputs = {"question": question} if budget is None else {"question": question, "budget": budget}
+    return await app.ainvoke(inputs, config)
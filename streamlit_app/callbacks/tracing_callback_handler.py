@@ -0,0 +1,283 @@
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Literal
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from pydantic import BaseModel
+
+from core.caches.semantic import CACHE_EVENT
+
+SpanKind = Literal["graph", "node", "llm", "retriever"]
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Span(BaseModel):
+    run_id: str
+    parent_id: str | None = None
+    name: str
+    kind: SpanKind
+    node: str | None = None
+    started_at: float
+    ended_at: float | None = None
+    status: Literal["running", "ok", "error"] = "running"
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    streamed_tokens: int = 0
+    first_token_seconds: float | None = None
+    retries: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    @property
+    def duration(self) -> float:
+        return (self.ended_at or time.time()) - self.started_at
+
+
+def _token_usage(response: LLMResult) -> tuple[int, int]:
+    usage = (response.llm_output or {}).get("token_usage") or (response.llm_output or {}).get("usage_metadata")
+    if usage:
+        return (
+            usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0,
+            usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0,
+        )
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += metadata.get("input_tokens", 0)
+            completion_tokens += metadata.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str | None) -> str:
+    return ",".join(f'{key}="{_escape(value or "")}"' for key, value in labels.items())
+
+
+class PrometheusMetrics:
+    """Process-wide span metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self, prefix: str = "lexlead") -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._buckets: dict[str, list[int]] = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self._sums: dict[str, float] = defaultdict(float)
+        self._counts: dict[str, int] = defaultdict(int)
+        self._counters: dict[tuple[str, str], float] = defaultdict(float)
+        self._server: ThreadingHTTPServer | None = None
+
+    def observe(self, span: Span) -> None:
+        labels = _labels(kind=span.kind, name=span.name, node=span.node)
+        with self._lock:
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if span.duration <= bound:
+                    self._buckets[labels][index] += 1
+            self._sums[labels] += span.duration
+            self._counts[labels] += 1
+            if span.status == "error":
+                self._counters[("span_errors_total", labels)] += 1
+            if span.kind == "llm":
+                llm_labels = _labels(name=span.name, node=span.node)
+                self._counters[("llm_prompt_tokens_total", llm_labels)] += span.prompt_tokens
+                self._counters[("llm_completion_tokens_total", llm_labels)] += span.completion_tokens or span.streamed_tokens
+                self._counters[("llm_retries_total", llm_labels)] += span.retries
+
+    def count_cache_lookup(self, namespace: str, hit: bool) -> None:
+        with self._lock:
+            self._counters[("cache_lookups_total", _labels(namespace=namespace, result="hit" if hit else "miss"))] += 1
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.prefix}_span_duration_seconds Duration of graph, node, LLM and retriever spans.",
+            f"# TYPE {self.prefix}_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for labels, buckets in sorted(self._buckets.items()):
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'{self.prefix}_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.prefix}_span_duration_seconds_bucket{{{labels},le="+Inf"}} {self._counts[labels]}')
+                lines.append(f"{self.prefix}_span_duration_seconds_sum{{{labels}}} {self._sums[labels]}")
+                lines.append(f"{self.prefix}_span_duration_seconds_count{{{labels}}} {self._counts[labels]}")
+            by_metric: dict[str, list[tuple[str, float]]] = defaultdict(list)
+            for (metric, labels), value in sorted(self._counters.items()):
+                by_metric[metric].append((labels, value))
+        for metric, samples in by_metric.items():
+            lines.append(f"# TYPE {self.prefix}_{metric} counter")
+            lines.extend(f"{self.prefix}_{metric}{{{labels}}} {value:g}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str | Path) -> None:
+        """Atomically write the metrics for the node_exporter textfile collector."""
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        tmp.replace(path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        """Expose ``/metrics`` for a local Prometheus scraper from a daemon thread."""
+        if self._server is not None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = metrics.render().encode("utf-8")
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns callback events into spans for the graph, its nodes, LLM calls and retrievals.
+
+    Nested chains that are not LangGraph nodes are not recorded, but their children are
+    attributed to the closest recorded ancestor, so an LLM call inside a grading chain
+    shows up under the ``grade_documents`` node.
+    """
+    run_inline = True
+
+    def __init__(self, metrics: PrometheusMetrics | None = None) -> None:
+        self.metrics = metrics
+        self.spans: dict[str, Span] = {}
+        self._parents: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def _ancestor(self, run_id: str | None) -> Span | None:
+        while run_id is not None:
+            if run_id in self.spans:
+                return self.spans[run_id]
+            run_id = self._parents.get(run_id)
+        return None
+
+    def _start(self, run_id: UUID, parent_run_id: UUID | None, name: str, kind: SpanKind | None) -> None:
+        run_id, parent_id = str(run_id), str(parent_run_id) if parent_run_id else None
+        with self._lock:
+            self._parents[run_id] = parent_id
+            if kind is None:
+                return
+            parent = self._ancestor(parent_id)
+            node = name if kind == "node" else parent.node if parent else None
+            self.spans[run_id] = Span(
+                run_id=run_id, parent_id=parent.run_id if parent else None, name=name, kind=kind, node=node,
+                started_at=time.time(),
+            )
+
+    def _end(self, run_id: UUID, status: Literal["ok", "error"]) -> Span | None:
+        with self._lock:
+            span = self.spans.get(str(run_id))
+            if span is None or span.ended_at is not None:
+                return None
+            span.ended_at, span.status = time.time(), status
+        if self.metrics is not None:
+            self.metrics.observe(span)
+        return span
+
+    def on_chain_start(self, serialized: dict[str, Any], inputs: Any, *, run_id: UUID,
+                       parent_run_id: UUID | None = None, metadata: dict[str, Any] | None = None,
+                       **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        if parent_run_id is None:
+            kind = "graph"
+        elif (metadata or {}).get("langgraph_node") == name:
+            kind = "node"
+        else:
+            kind = None
+        self._start(run_id, parent_run_id, name, kind)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "error")
+
+    def _on_model_start(self, serialized: dict[str, Any], run_id: UUID, parent_run_id: UUID | None,
+                        kwargs: dict[str, Any]) -> None:
+        params = kwargs.get("invocation_params") or {}
+        name = params.get("model") or params.get("model_name") or kwargs.get("name") or (serialized or {}).get("name") or "llm"
+        self._start(run_id, parent_run_id, name, "llm")
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID,
+                     parent_run_id: UUID | None = None, **kwargs: Any) -> None:
+        self._on_model_start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *, run_id: UUID,
+                            parent_run_id: UUID | None = None, **kwargs: Any) -> None:
+        self._on_model_start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self.spans.get(str(run_id))
+        if span is not None:
+            if span.first_token_seconds is None:
+                span.first_token_seconds = time.time() - span.started_at
+            span.streamed_tokens += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self.spans.get(str(run_id))
+        if span is not None:
+            span.prompt_tokens, span.completion_tokens = _token_usage(response)
+        self._end(run_id, "ok")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "error")
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._ancestor(str(run_id))
+        if span is not None:
+            span.retries += 1
+
+    def on_retriever_start(self, serialized: dict[str, Any], query: str, *, run_id: UUID,
+                           parent_run_id: UUID | None = None, **kwargs: Any) -> None:
+        self._start(run_id, parent_run_id, kwargs.get("name") or (serialized or {}).get("name") or "retriever", "retriever")
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "ok")
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, "error")
+
+    def on_custom_event(self, name: str, data: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if name != CACHE_EVENT:
+            return
+        span = self._ancestor(str(run_id))
+        if span is not None:
+            if data["hit"]:
+                span.cache_hits += 1
+            else:
+                span.cache_misses += 1
+        if self.metrics is not None:
+            self.metrics.count_cache_lookup(data["namespace"], data["hit"])
+
+    def summary(self) -> list[dict[str, Any]]:
+        rows: dict[tuple[str, str], dict[str, Any]] = {}
+        for span in sorted(self.spans.values(), key=lambda span: span.started_at):
+            row = rows.setdefault((span.kind, span.name), {
+                "kind": span.kind, "name": span.name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0, "retries": 0, "cache_hits": 0, "errors": 0,
+            })
+            duration_ms = span.duration * 1000
+            row["calls"] += 1
+            row["total_ms"] += duration_ms
+            row["max_ms"] = max(row["max_ms"], duration_ms)
+            row["prompt_tokens"] += span.prompt_tokens
+            row["completion_tokens"] += span.completion_tokens or span.streamed_tokens
+            row["retries"] += span.retries
+            row["cache_hits"] += span.cache_hits
+            row["errors"] += span.status == "error"
+        return list(rows.values())
@@ -1,19 +1,108 @@
+import uuid
+
 import streamlit as st
 
+from core.history.store import ChatMessage, ConversationHistory
+
+WELCOME_MESSAGE = "How may I assist you today?"
+ANONYMOUS_USER = "anonymous"
+HISTORY_PAGE_SIZE = 20
+
+
+CONVERSATION_PARAM = "conversation"
+
+
+def _share_conversation(conversation_id: str):
+    # anonymous sessions have no owner to check a link against, so their conversation id stays out of the URL
+    if st.session_state.get("username"):
+        st.query_params[CONVERSATION_PARAM] = conversation_id
+    else:
+        st.query_params.pop(CONVERSATION_PARAM, None)
+
+
+def _start_conversation():
+    st.session_state.conversation_id = uuid.uuid4().hex
+    _share_conversation(st.session_state.conversation_id)
+    st.session_state.next_seq = 0
+    st.session_state.oldest_seq = None
+    st.session_state.has_earlier_messages = False
+    st.session_state.messages = [{"role": "assistant", "content": WELCOME_MESSAGE}]
+
+
+def _session_messages(page: list[ChatMessage]) -> list[dict]:
+    # messages still queued for writing have no seq yet, they follow the stored ones
+    messages, seq = [], -1
+    for m in page:
+        seq = m.seq if m.seq is not None else seq + 1
+        messages.append({"role": m.role, "content": m.content, "seq": seq})
+    return messages
 
-def fill_messages_from_session():
+
+def _oldest_stored_seq(page: list[ChatMessage]) -> int | None:
+    return next((m.seq for m in page if m.seq is not None), None)
+
+
+def _resume_conversation(history: ConversationHistory):
+    # signed in users get the conversation in the URL, or else their latest one, back if they own it
+    username = st.session_state.get("username")
+    conversation_id = st.query_params.get(CONVERSATION_PARAM) if username else None
+    if conversation_id is None and username:
+        conversation_id = history.latest_conversation(username)
+    page = history.page(conversation_id, limit=HISTORY_PAGE_SIZE) if conversation_id else []
+    if not page or page[0].user_id != username:
+        _start_conversation()
+        return
+    st.session_state.conversation_id = conversation_id
+    _share_conversation(conversation_id)
+    st.session_state.messages = _session_messages(page)
+    st.session_state.next_seq = st.session_state.messages[-1]["seq"] + 1
+    st.session_state.oldest_seq = _oldest_stored_seq(page)
+    st.session_state.has_earlier_messages = bool(st.session_state.oldest_seq)
+
+
+def load_earlier_messages(history: ConversationHistory):
+    page = history.page(st.session_state.conversation_id, before_seq=st.session_state.oldest_seq,
+                        limit=HISTORY_PAGE_SIZE)
+    if page:
+        st.session_state.messages[:0] = _session_messages(page)
+        st.session_state.oldest_seq = page[0].seq
+    st.session_state.has_earlier_messages = bool(page) and page[0].seq > 0
+
+
+def fill_messages_from_session(history: ConversationHistory | None = None):
     if "messages" not in st.session_state.keys():
-        st.session_state.messages = [{"role": "assistant", "content": "How may I assist you today?"}]
+        if history is None:
+            _start_conversation()
+        else:
+            _resume_conversation(history)
+
+    if history is not None and st.session_state.get("has_earlier_messages"):
+        st.button("Load earlier messages", on_click=load_earlier_messages, args=(history,))
 
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.write(message["content"])
 
 
-def clear_chat_history():
-    st.session_state.messages = [{"role": "assistant", "content": "How may I assist you today?"}]
+def append_message(role: str, content: str, history: ConversationHistory | None = None):
+    seq = st.session_state.next_seq
+    st.session_state.messages.append({"role": role, "content": content, "seq": seq})
+    st.session_state.next_seq = seq + 1
+    if history is not None:
+        history.append(ChatMessage(
+            conversation_id=st.session_state.conversation_id,
+            user_id=st.session_state.get("username") or ANONYMOUS_USER,
+            role=role,
+            content=str(content),
+        ))
+
+
+def clear_chat_history(history: ConversationHistory | None = None):
+    if history is not None and "conversation_id" in st.session_state:
+        history.delete(st.session_state.conversation_id)
+    _start_conversation()
 
 
 def is_zip_file(byte_stream: bytes | bytearray) -> bool:
     zip_signature = b'\x50\x4B\x03\x04'
-    return byte_stream[:4] == zip_signature
\ No newline at end of file
+    return byte_stream[:4] == zip_signature
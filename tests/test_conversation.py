@@ -0,0 +1,65 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
+
+from core.chains.conversation import ContextWindowManager
+from core.history.store import ConversationContext, ConversationHistory, build_conversation_store
+
+
+def _manager(**kwargs) -> ContextWindowManager:
+    summarizer = RunnableLambda(lambda inputs: f"{inputs['summary']} | {inputs['lines']}")
+    condenser = RunnableLambda(lambda inputs: inputs["question"])
+    return ContextWindowManager(summarizer=summarizer, condenser=condenser, **kwargs)
+
+
+def _messages(count: int, words: int = 1) -> list[dict]:
+    greeting = [{"role": "assistant", "content": "How may I assist you today?"}]
+    return greeting + [
+        {"role": "user" if seq % 2 == 0 else "assistant", "content": " ".join([f"m{seq}"] * words), "seq": seq}
+        for seq in range(count)
+    ]
+
+
+def test_window_keeps_the_last_turns_verbatim():
+    to_fold, recent = _manager(max_turns=2).window(ConversationContext(), _messages(7))
+    assert [m["seq"] for m in to_fold] == [0, 1, 2]
+    assert [m["seq"] for m in recent] == [3, 4, 5, 6]
+
+
+def test_window_skips_summarized_messages():
+    to_fold, recent = _manager(max_turns=2).window(ConversationContext(summarized_seq=4), _messages(7))
+    assert to_fold == []
+    assert [m["seq"] for m in recent] == [5, 6]
+
+
+def test_window_drops_recent_turns_over_the_token_budget():
+    manager = _manager(max_turns=3, token_budget=300, summary_max_tokens=100)
+    to_fold, recent = manager.window(ConversationContext(), _messages(6, words=80))
+    assert [m["seq"] for m in recent] == [4, 5]
+    assert [m["seq"] for m in to_fold] == [0, 1, 2, 3]
+
+
+def test_update_and_history():
+    manager = _manager(max_turns=1)
+    messages = _messages(4)
+    context = manager.update(ConversationContext(), messages)
+    assert context.summarized_seq == 1
+    assert "m0" in context.summary and "m1" in context.summary
+    assert manager.update(context, messages) is context
+
+    history = manager.history(context, messages)
+    assert [type(message) for message in history] == [SystemMessage, HumanMessage, AIMessage]
+    assert history[1].content == "m2"
+
+
+def test_folded_context_is_stored_with_the_conversation(tmp_path):
+    path = tmp_path / "history.sqlite3"
+    manager = _manager(max_turns=1)
+    messages = _messages(4)
+    history = ConversationHistory(build_conversation_store(path))
+    folded = history.fold_context("c", lambda stored: manager.update(stored, messages)).result(timeout=5)
+    assert folded.summarized_seq == 1
+    assert history.fold_context("c", lambda stored: stored).result(timeout=5) == folded
+
+    assert ConversationHistory(build_conversation_store(path)).context("c") == folded
+    assert history.context("other") == ConversationContext()
+    history.writer.close()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from core.caches.embeddings import MemoryMappedVectorStore
+
+
+def test_round_trip_across_instances(tmp_path):
+    store = MemoryMappedVectorStore(tmp_path)
+    store.put_many([("a", [1.0, 2.0]), ("b", [3.0, 4.0])])
+    store.put_many([("a", [9.0, 9.0])])
+    assert len(store) == 2
+    reopened = MemoryMappedVectorStore(tmp_path)
+    assert reopened.get("a") == [1.0, 2.0]
+    assert reopened.get("b") == [3.0, 4.0]
+    assert reopened.get("missing") is None
+
+
+def test_picks_up_rows_written_by_another_instance(tmp_path):
+    first, second = MemoryMappedVectorStore(tmp_path), MemoryMappedVectorStore(tmp_path)
+    first.put_many([("a", [1.0])])
+    second.put_many([("b", [2.0])])
+    assert first.get("b") == [2.0]
+    assert second.get("a") == [1.0]
+
+
+def test_torn_key_line_and_orphan_rows_are_truncated(tmp_path):
+    store = MemoryMappedVectorStore(tmp_path)
+    store.put_many([("a", [1.0, 1.0])])
+    # a writer crashed after writing two vectors and half of a key line
+    with open(tmp_path / "vectors.f32", "ab") as file:
+        file.write(np.full((2, 2), 7, np.float32).tobytes())
+    with open(tmp_path / "keys.txt", "ab") as file:
+        file.write(b"tor")
+
+    recovered = MemoryMappedVectorStore(tmp_path)
+    assert recovered.get("tor") is None
+    recovered.put_many([("b", [2.0, 2.0])])
+    assert (tmp_path / "keys.txt").read_text() == "a\nb\n"
+    assert (tmp_path / "vectors.f32").stat().st_size == 2 * 2 * 4
+    assert MemoryMappedVectorStore(tmp_path).get("b") == [2.0, 2.0]
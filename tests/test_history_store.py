@@ -0,0 +1,181 @@
+import threading
+
+import pytest
+
+from core.history.store import (
+    BufferedConversationWriter,
+    ChatMessage,
+    ConversationContext,
+    ConversationHistory,
+    ConversationStore,
+    build_conversation_store,
+)
+
+
+def _message(content: str, conversation_id: str = "c", user_id: str = "u", **kwargs) -> ChatMessage:
+    return ChatMessage(conversation_id=conversation_id, user_id=user_id, role="user", content=content, **kwargs)
+
+
+@pytest.fixture(params=["history.sqlite3", "history.jsonl"])
+def path(request, tmp_path):
+    return tmp_path / request.param
+
+
+def test_round_trip_and_paging(path):
+    store = build_conversation_store(path)
+    store.write_batch([_message(f"m{i}") for i in range(5)])
+
+    reopened = build_conversation_store(path)
+    latest = reopened.load_page("c", limit=2)
+    assert [(m.seq, m.content) for m in latest] == [(3, "m3"), (4, "m4")]
+    assert [m.seq for m in reopened.load_page("c", before_seq=3, limit=10)] == [0, 1, 2]
+    assert reopened.load_page("missing") == []
+    assert reopened.latest_conversation("u") == "c"
+    assert reopened.latest_conversation("nobody") is None
+
+
+def test_seq_continues_after_other_writers(path):
+    first, second = build_conversation_store(path), build_conversation_store(path)
+    first.write_batch([_message("a"), _message("b")])
+    second.write_batch([_message("c")])
+    first.write_batch([_message("d"), _message("x", conversation_id="other")])
+    assert [(m.seq, m.content) for m in second.load_page("c")] == [(0, "a"), (1, "b"), (2, "c"), (3, "d")]
+    assert [m.seq for m in second.load_page("other")] == [0]
+
+
+def test_retried_messages_are_written_once(path):
+    store = build_conversation_store(path)
+    message = _message("once")
+    store.write_batch([message, message])
+    store.write_batch([message, _message("next")])
+    assert [(m.seq, m.content) for m in store.load_page("c")] == [(0, "once"), (1, "next")]
+
+
+def test_compact_drops_deleted_and_idle_conversations(path):
+    store = build_conversation_store(path)
+    store.write_batch([
+        _message("old", conversation_id="idle", created_at=0.0),
+        _message("kept", conversation_id="kept"),
+        _message("gone", conversation_id="deleted"),
+    ])
+    store.delete("deleted")
+    assert store.load_page("deleted") == []
+
+    assert build_conversation_store(path).compact(retention_days=30) == 2
+    assert store.load_page("idle") == []
+    assert [m.content for m in store.load_page("kept")] == ["kept"]
+    store.write_batch([_message("after", conversation_id="kept")])
+    assert [m.seq for m in build_conversation_store(path).load_page("kept")] == [0, 1]
+
+
+def test_delete_before_the_messages_are_written(path):
+    store = build_conversation_store(path)
+    store.delete("c")
+    store.write_batch([_message("late")])
+    assert store.load_page("c") == []
+    assert store.latest_conversation("u") is None
+
+
+def test_context_keeps_the_furthest_summary(path):
+    store = build_conversation_store(path)
+    assert store.load_context("c") is None
+    store.save_context("c", ConversationContext(summary="up to 3", summarized_seq=3))
+    store.save_context("c", ConversationContext(summary="stale fold", summarized_seq=1))
+    assert build_conversation_store(path).load_context("c") == ConversationContext(summary="up to 3", summarized_seq=3)
+
+
+def test_context_follows_its_conversation(path):
+    store = build_conversation_store(path)
+    store.write_batch([_message("kept", conversation_id="kept"), _message("gone", conversation_id="deleted")])
+    for conversation_id in ("kept", "deleted"):
+        store.save_context(conversation_id, ConversationContext(summary=conversation_id, summarized_seq=0))
+    store.delete("deleted")
+    assert store.load_context("deleted") is None
+
+    store.compact()
+    reopened = build_conversation_store(path)
+    assert reopened.load_context("kept") == ConversationContext(summary="kept", summarized_seq=0)
+    assert reopened.load_context("deleted") is None
+
+
+def test_torn_log_line_is_skipped_and_truncated(tmp_path):
+    path = tmp_path / "history.jsonl"
+    store = build_conversation_store(path)
+    store.write_batch([_message("a")])
+    with open(path, "a") as file:
+        file.write('{"type": "mess')
+
+    recovered = build_conversation_store(path)
+    assert [m.content for m in recovered.load_page("c")] == ["a"]
+    recovered.write_batch([_message("b")])
+    assert [(m.seq, m.content) for m in build_conversation_store(path).load_page("c")] == [(0, "a"), (1, "b")]
+
+
+class FlakyStore(ConversationStore):
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.batches: list[list[str]] = []
+        self.released = threading.Event()
+
+    def write_batch(self, messages):
+        self.released.wait()
+        if self.failures:
+            self.failures -= 1
+            raise OSError("store unavailable")
+        self.batches.append([m.content for m in messages])
+
+    def load_page(self, conversation_id, before_seq=None, limit=20):
+        return []
+
+    def latest_conversation(self, user_id):
+        return None
+
+    def save_context(self, conversation_id, context):
+        pass
+
+    def load_context(self, conversation_id):
+        return None
+
+    def delete(self, conversation_id):
+        pass
+
+    def compact(self, retention_days=None):
+        return 0
+
+
+def test_writer_batches_and_flushes():
+    store = FlakyStore(failures=0)
+    store.released.set()
+    writer = BufferedConversationWriter(store, batch_size=2, flush_interval=60)
+    for content in "abc":
+        writer.append(_message(content))
+    assert writer.flush(timeout=5)
+    assert store.batches == [["a", "b"], ["c"]]
+    assert writer.written == 3
+    writer.close()
+
+
+def test_writer_retries_failed_batches_in_order():
+    store = FlakyStore(failures=2)
+    writer = BufferedConversationWriter(store, batch_size=8, flush_interval=0.01)
+    writer.append(_message("a"))
+    writer.append(_message("b"))
+    store.released.set()
+    assert writer.flush(timeout=5)
+    assert writer.failures == 2
+    assert store.batches == [["a", "b"]]
+    writer.close()
+
+
+def test_history_pages_include_queued_messages(tmp_path):
+    store = build_conversation_store(tmp_path / "history.sqlite3")
+    store.write_batch([_message("stored")])
+    history = ConversationHistory(store, flush_interval=60)
+    history.append(_message("queued"))
+    assert [(m.seq, m.content) for m in history.page("c")] == [(0, "stored"), (None, "queued")]
+    assert history.page("c", before_seq=0) == []
+
+    history.delete("c")
+    assert history.page("c") == []
+    assert history.writer.pending("c") == []
+    history.writer.close()
@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.documents import Document
+
+from core.retrievers.hybrid import is_citation_query, reciprocal_rank_fusion
+
+
+@pytest.mark.parametrize("query", [
+    "What does 720 ILCS 5/12-3.05 say?",
+    "Explain 410 ILCS 82",
+    "penalties under 5/12-3",
+    "What is § 12-3?",
+    "Section 10-5 of the Criminal Code",
+    "sec. 11-501 DUI",
+])
+def test_citation_queries(query):
+    assert is_citation_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "In section 2 of my lease, can landlord evict?",
+    "article 1 of the contract I signed",
+    "My lease ended on 3/15/2024, can I get my deposit back?",
+    "Can I keep 1/2 of the deposit?",
+    "What does § 5 of my agreement mean?",
+    "how many seconds 12-3",
+])
+def test_prose_queries(query):
+    assert not is_citation_query(query)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    a, b, c = Document(page_content="a"), Document(page_content="b"), Document(page_content="c")
+    fused = reciprocal_rank_fusion([[a, b], [b, c]], rrf_k=60)
+    assert [document.page_content for document, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+
+
+def test_reciprocal_rank_fusion_keeps_first_copy_of_duplicates():
+    first = Document(page_content="same", metadata={"source": "lexical"})
+    second = Document(page_content="same", metadata={"source": "dense"})
+    fused = reciprocal_rank_fusion([[first], [second]])
+    assert len(fused) == 1
+    assert fused[0][0].metadata == {"source": "lexical"}
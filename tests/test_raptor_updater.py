@@ -0,0 +1,44 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from core.raptor.builder import RaptorNode, RaptorTreeBuilder
+from core.raptor.updater import RaptorTreeUpdater
+
+VECTORS = {"lease": [1.0, 0.0], "deposit": [0.9, 0.1], "battery": [0.0, 1.0], "assault": [0.1, 0.9]}
+
+
+class TopicEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return VECTORS[text]
+
+
+def _updater() -> RaptorTreeUpdater:
+    return RaptorTreeUpdater(RaptorTreeBuilder(FakeListChatModel(responses=["summary"]), TopicEmbeddings()))
+
+
+def _leaf(text: str) -> RaptorNode:
+    return RaptorNode(id=text, text=text, level=0)
+
+
+def test_assign_skips_summaries_without_known_children():
+    nodes = {leaf.id: leaf for leaf in (_leaf("lease"), _leaf("battery"))}
+    summaries = [
+        RaptorNode(id="housing", text="housing", level=1, children=["lease"]),
+        RaptorNode(id="gone", text="gone", level=1, children=["removed"]),
+        RaptorNode(id="criminal", text="criminal", level=1, children=["battery"]),
+    ]
+    assigned, outliers = asyncio.run(_updater()._assign(summaries, nodes, [_leaf("deposit"), _leaf("assault")]))
+    assert dict(assigned) == {"housing": ["deposit"], "criminal": ["assault"]}
+    assert outliers == 0
+
+
+def test_assign_counts_every_leaf_as_outlier_when_no_summary_has_children():
+    summaries = [RaptorNode(id="gone", text="gone", level=1, children=["removed"])]
+    assigned, outliers = asyncio.run(_updater()._assign(summaries, {}, [_leaf("deposit")]))
+    assert assigned == {}
+    assert outliers == 1